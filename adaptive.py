@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Configuration values
+MIN_WINDOW = 16  # Completions collected before the limit is adjusted (at least the current limit)
+DECREASE = 0.7  # Multiplicative decrease on overload
+LATENCY_TOLERANCE = 2.0  # Window median latency above this multiple of the best median counts as overload
+BASELINE_DRIFT = 1.05  # The best median is allowed to creep up by this much per window
+TIMEOUT_MARGIN = 0.95  # Calls taking this share of the timeout are counted as timed out
+MAX_TIMEOUT_RATE = 0.05  # Share of timed out calls per window tolerated before backing off
+LOAD_TARGET = 1.0  # 1 minute load average per CPU above which CPU-bound limits back off
+
+
+def cpu_overloaded():
+    try:
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):  # Windows has no load average
+        return False
+    return load / (os.cpu_count() or 1) > LOAD_TARGET
+
+
+class AdaptiveLimit:
+    # AIMD concurrency limit. Every window of completions the limit grows by
+    # one, unless the window saw too many timeouts, latency well above the
+    # best observed median (requests queueing behind each other) or, for
+    # CPU-bound work, a load average above LOAD_TARGET; then it is cut by
+    # DECREASE. Callers run their work inside `with limit.slot():`.
+    def __init__(self, initial, minimum=1, maximum=None, timeout=None, cpu_bound=False):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum or initial
+        self.timeout = timeout
+        self.cpu_bound = cpu_bound
+        self.in_flight = 0
+        self._condition = threading.Condition()
+        self._latencies = []
+        self._timeouts = 0
+        self._baseline = None
+
+    def __repr__(self):
+        return f'AdaptiveLimit(limit={self.limit}, in_flight={self.in_flight})'
+
+    @contextmanager
+    def slot(self):
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._completed(time.monotonic() - start)
+
+    def _completed(self, latency):
+        with self._condition:
+            self.in_flight -= 1
+            self._latencies.append(latency)
+            if self.timeout and latency >= self.timeout * TIMEOUT_MARGIN:
+                self._timeouts += 1
+            if len(self._latencies) >= max(self.limit, MIN_WINDOW):
+                self._adjust()
+            self._condition.notify_all()
+
+    def _adjust(self):
+        latencies = sorted(self._latencies)
+        median = latencies[len(latencies) // 2]
+        timeout_rate = self._timeouts / len(latencies)
+        self._baseline = median if self._baseline is None else min(median, self._baseline * BASELINE_DRIFT)
+
+        overloaded = (
+            timeout_rate > MAX_TIMEOUT_RATE
+            or median > self._baseline * LATENCY_TOLERANCE
+            or (self.cpu_bound and cpu_overloaded())
+        )
+        if overloaded:
+            self.limit = max(self.minimum, int(self.limit * DECREASE))
+        else:
+            self.limit = min(self.maximum, self.limit + 1)
+        self._latencies = []
+        self._timeouts = 0
@@ -0,0 +1,395 @@
+import argparse
+import glob
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+import group_titles
+import liveness
+import m3u
+import net
+import pipeline
+import probe
+import stages
+import throughput
+import xmltv
+from dedupe import deduplicate
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Configuration values
+FIXTURE_DIR = os.path.join(HERE, 'fixtures')  # Generated catalogs and guides, reused between runs
+BASELINE_PATH = os.path.join(HERE, 'baseline.json')
+SCALES = {'real': None, '100k': 100000, '1m': 1000000}  # 'real' concatenates the files in Playlist/
+EPG_CHANNELS = 20000  # Channels in the synthetic XMLTV guide
+PROBE_REQUESTS = 2000  # Streams requested by the probe benchmarks
+PROBE_WORKERS = 100
+THROUGHPUT_REQUESTS = 200  # Streams measured by the segment throughput benchmark, each downloading several segments
+REPEAT = 3  # Runs per stage benchmark
+TOLERANCE = 0.20  # Allowed slowdown against the baseline before a result counts as a regression
+SEED = 42
+
+WORDS = ['tv', 'rcti', 'sctv', 'tvri', 'news', 'sport', 'sports', 'movie', 'cinema', 'kids', 'music', 'drama',
+         'channel', 'one', 'plus', 'max', 'asia', 'world', 'nasional', 'global', 'life', 'family', 'star',
+         'fox', 'hbo', 'bein', 'espn', 'cnn', 'bbc', 'nat', 'geo', 'discovery', 'animal', 'planet', 'history']
+QUALITY = ['', '', ' HD', ' FHD', ' (1080p)', ' (720p)', ' [Not 24/7]']
+
+
+# Fixtures
+
+def channel_name(rng):
+    return ' '.join(rng.choice(WORDS).title() for _ in range(rng.randint(1, 3))) + f' {rng.randint(1, 99)}'
+
+
+def synthetic_catalog(path, size):
+    # About 10% of the entries repeat an earlier stream URL with cosmetic
+    # differences (host case, tracking parameters) for the dedupe stage.
+    rng = random.Random(SEED)
+    rules = json.load(open(group_titles.RULES_PATH, encoding='utf-8'))
+    groups = list(rules['translations']) + list(rules['standard_group_titles']) + ['Uncategorized', 'Misc  Channels']
+    urls = []
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('#EXTM3U\n')
+        for number in range(size):
+            name = channel_name(rng) + rng.choice(QUALITY)
+            if rng.random() < 0.5:
+                name += f' ({rng.uniform(0.2, 9.0):.1f}s)'
+            tvg_id = f'{name.split(" ")[0]}{number % 5000}.id' if rng.random() < 0.6 else ''
+            if urls and rng.random() < 0.1:
+                url = rng.choice(urls).replace('http://stream', 'HTTP://Stream') + '?utm_source=bench'
+            else:
+                url = f'http://stream{number % 997}.example.com/live/{number}/index.m3u8'
+                if len(urls) < 10000:
+                    urls.append(url)
+            file.write(f'#EXTINF:-1 tvg-id="{tvg_id}" tvg-name="{name}" tvg-logo="http://logo.example.com/{number}.png" '
+                       f'group-title="{rng.choice(groups)}",{name}\n')
+            if rng.random() < 0.05:
+                file.write('#KODIPROP:inputstream=inputstream.adaptive\n')
+            file.write(url + '\n')
+
+
+def real_catalog(path):
+    with open(path, 'w', encoding='utf-8') as output:
+        output.write('#EXTM3U\n')
+        for source in sorted(glob.glob(os.path.join(ROOT, 'Playlist', '*'))):
+            with open(source, 'r', encoding='utf-8', errors='replace') as file:
+                for line in file:
+                    if not line.startswith('#EXTM3U'):
+                        output.write(line)
+            output.write('\n')
+
+
+def synthetic_guide(path, channels):
+    rng = random.Random(SEED)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n<tv>\n')
+        for number in range(channels):
+            name = channel_name(rng)
+            file.write(f'<channel id="ch{number}.bench"><display-name>{name}</display-name>'
+                       f'<display-name>{name} HD</display-name></channel>\n')
+        for number in range(channels):
+            for hour in range(4):
+                file.write(f'<programme start="2024010{hour}0000 +0000" channel="ch{number}.bench">'
+                           f'<title>Show {hour}</title><desc>Synthetic programme</desc></programme>\n')
+        file.write('</tv>\n')
+
+
+def fixture(name, build, *args):
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    path = os.path.join(FIXTURE_DIR, name)
+    if not os.path.exists(path):
+        print(f'Generating {name}...', file=sys.stderr)
+        build(path + '.tmp', *args)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def catalog(scale):
+    if SCALES[scale] is None:
+        return fixture('real.m3u', real_catalog)
+    return fixture(f'catalog-{scale}.m3u', synthetic_catalog, SCALES[scale])
+
+
+def guide(channels):
+    return fixture(f'guide-{channels}.xml', synthetic_guide, channels)
+
+
+# Benchmarks. Each one prepares its input outside the timed region and returns
+# a callable that runs the stage once and returns (items, per-item latencies
+# or None).
+
+def load(scale):
+    return list(m3u.iter_playlist(catalog(scale)))
+
+
+def bench_parse(scale, options):
+    path = catalog(scale)
+    return lambda: (sum(1 for _ in m3u.iter_playlist(path)), None)
+
+
+def bench_clean(scale, options):
+    entries = load(scale)
+    return lambda: (len(list(pipeline.apply(entries, stages.format_group_title))), None)
+
+
+def bench_dedupe(scale, options):
+    entries = load(scale)
+
+    def run():
+        for _ in deduplicate(entries, 'best'):
+            pass
+        return len(entries), None
+    return run
+
+
+def bench_standardize(scale, options):
+    entries = load(scale)
+
+    def run():
+        group_titles._rules = None  # Include compiling the automata and a cold memo
+        return len(list(stages.standardize_group_titles(entries))), None
+    return run
+
+
+def bench_sort(scale, options):
+    entries = load(scale)
+    rng = random.Random(SEED)
+    for entry in entries:
+        if rng.random() < 0.5:
+            entry.latency = rng.uniform(0.2, 9.0)
+    return lambda: (len(list(stages.sort_entries(entries))), None)
+
+
+def bench_write(scale, options):
+    entries = load(scale)
+
+    def run():
+        with tempfile.TemporaryDirectory() as directory:
+            m3u.write_playlist(os.path.join(directory, 'out.m3u'), entries)
+        return len(entries), None
+    return run
+
+
+def bench_xmltv(scale, options):
+    path = guide(options.epg_channels)
+    return lambda: (sum(1 for _ in xmltv.parse_file(path)), None)
+
+
+def bench_epg_match(scale, options):
+    entries = load(scale)
+    tvg_ids = {}
+    for channel_id, display_names in xmltv.parse_file(guide(options.epg_channels)):
+        for display_name in display_names:
+            tvg_ids[display_name.lower()] = channel_id
+    return lambda: (len(stages.update_tvg_ids(entries, tvg_ids, processes=options.processes)[0]), None)
+
+
+def _timed_requests(func, urls, workers):
+    def timed(url):
+        start = time.perf_counter()
+        func(url)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(timed, urls))
+
+
+def mock_urls(options):
+    return [f'{options.mock_url}/live/{number}/index.m3u8' for number in range(options.requests)]
+
+
+def bench_manifest(scale, options):
+    urls = mock_urls(options)
+
+    def run():
+        session = net.make_session(options.workers)
+        latencies = _timed_requests(lambda url: probe.fetch_manifest(session, url), urls, options.workers)
+        return len(urls), latencies
+    return run
+
+
+def bench_throughput(scale, options):
+    urls = mock_urls(options)[:THROUGHPUT_REQUESTS]
+
+    def run():
+        session = net.make_session(options.workers)
+        latencies = _timed_requests(lambda url: throughput.measure(session, url), urls, options.workers)
+        return len(urls), latencies
+    return run
+
+
+def bench_liveness(scale, options):
+    # check_urls runs every request inside one event loop, so the per-request
+    # latency is not visible from here; the run time is reported instead.
+    urls = mock_urls(options)
+    return lambda: (len(liveness.check_urls(urls, per_host=options.workers, desc='liveness')), None)
+
+
+STAGE_BENCHMARKS = {
+    'parse': bench_parse,
+    'clean': bench_clean,
+    'dedupe': bench_dedupe,
+    'standardize': bench_standardize,
+    'sort': bench_sort,
+    'write': bench_write,
+    'epg-match': bench_epg_match,
+}
+FIXED_BENCHMARKS = {  # Independent of the catalog scale
+    'xmltv-parse': bench_xmltv,
+    'probe-manifest': bench_manifest,
+    'probe-throughput': bench_throughput,
+    'liveness': bench_liveness,
+}
+NETWORK_BENCHMARKS = ('probe-manifest', 'probe-throughput', 'liveness')
+
+
+# Measurement
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_one(name, scale, options):
+    # Runs in a fresh interpreter so the peak RSS belongs to this stage only
+    benchmark = {**STAGE_BENCHMARKS, **FIXED_BENCHMARKS}[name]
+    run = benchmark(scale, options)
+    durations = []
+    latencies = []
+    items = 0
+    for _ in range(options.repeat):
+        start = time.perf_counter()
+        items, item_latencies = run()
+        durations.append(time.perf_counter() - start)
+        latencies.extend(item_latencies or ())
+    median = percentile(durations, 0.5)
+    samples = latencies or durations
+    return {
+        'items': items,
+        'seconds': median,
+        'throughput': items / median if median else None,
+        'latency': 'request' if latencies else 'run',
+        'p50': percentile(samples, 0.5),
+        'p99': percentile(samples, 0.99),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def spawn(name, scale, options):
+    command = [sys.executable, os.path.abspath(__file__), '--run-one', name, '--scale', scale,
+               '--repeat', str(options.repeat), '--epg-channels', str(options.epg_channels),
+               '--requests', str(options.requests), '--workers', str(options.workers),
+               '--processes', str(options.processes)]
+    if options.mock_url:
+        command += ['--mock-url', options.mock_url]
+    output = subprocess.run(command, stdout=subprocess.PIPE, check=True).stdout
+    return json.loads(output)
+
+
+def compare(key, result, baseline, tolerance):
+    # Returns the list of metrics that got worse than the baseline allows
+    previous = baseline.get(key)
+    if not previous:
+        return []
+    worse = []
+    if previous.get('throughput') and result['throughput'] < previous['throughput'] * (1 - tolerance):
+        worse.append('throughput')
+    if previous.get('p99') and result['p99'] > previous['p99'] * (1 + tolerance):
+        worse.append('p99')
+    if previous.get('peak_rss_mb') and result['peak_rss_mb'] and result['peak_rss_mb'] > previous['peak_rss_mb'] * (1 + tolerance):
+        worse.append('peak_rss_mb')
+    return worse
+
+
+def print_row(key, result, worse):
+    flag = f'  REGRESSION: {", ".join(worse)}' if worse else ''
+    rss = f'{result["peak_rss_mb"]:8.1f}' if result['peak_rss_mb'] is not None else '     n/a'
+    print(f'{key:28} {result["items"]:>9} {result["throughput"]:>12.0f}/s '
+          f'p50 {result["p50"] * 1000:9.2f}ms p99 {result["p99"] * 1000:9.2f}ms ({result["latency"]}) '
+          f'rss {rss} MB{flag}')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the playlist pipeline stages.')
+    parser.add_argument('--stages', default=','.join([*STAGE_BENCHMARKS, *FIXED_BENCHMARKS]),
+                        help='comma separated benchmarks to run')
+    parser.add_argument('--scales', default='real,100k', help='comma separated catalog sizes: ' + ','.join(SCALES))
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--epg-channels', type=int, default=EPG_CHANNELS)
+    parser.add_argument('--requests', type=int, default=PROBE_REQUESTS)
+    parser.add_argument('--workers', type=int, default=PROBE_WORKERS)
+    parser.add_argument('--processes', type=int, default=stages.MATCH_PROCESSES, help='worker processes for epg-match')
+    parser.add_argument('--latency', type=float, default=0.05, help='mock server delay per request in seconds')
+    parser.add_argument('--failure-rate', type=float, default=0.1, help='share of mock streams answering 503')
+    parser.add_argument('--bandwidth', type=float, help='mock server bytes per second of every response body')
+    parser.add_argument('--mock-url', help='use an already running mock server instead of starting one')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the new baseline')
+    parser.add_argument('--run-one', help=argparse.SUPPRESS)
+    parser.add_argument('--scale', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    options = parse_args()
+    if options.run_one:
+        json.dump(run_one(options.run_one, options.scale, options), sys.stdout)
+        return 0
+
+    names = options.stages.split(',')
+    server = None
+    if not options.mock_url and any(name in NETWORK_BENCHMARKS for name in names):
+        import mock_server
+        server, options.mock_url = mock_server.start(options.latency, options.failure_rate,
+                                                     bandwidth=options.bandwidth)
+
+    baseline = {}
+    if os.path.exists(options.baseline):
+        with open(options.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+
+    results = {}
+    regressions = 0
+    try:
+        for name in names:
+            scales = options.scales.split(',') if name in STAGE_BENCHMARKS else ['fixed']
+            for scale in scales:
+                key = f'{name}/{scale}'
+                results[key] = spawn(name, scale, options)
+                worse = compare(key, results[key], baseline, options.tolerance)
+                regressions += bool(worse)
+                print_row(key, results[key], worse)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    if options.save_baseline:
+        baseline.update(results)
+        with open(options.baseline, 'w', encoding='utf-8') as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+        print(f'Baseline saved to {options.baseline}')
+    return 1 if regressions and not options.save_baseline else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
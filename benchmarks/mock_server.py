@@ -0,0 +1,108 @@
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Mock HLS origin for the probe benchmarks. Every path is answered after
+# `latency` seconds; a fixed share of paths (failure_rate, decided per path so
+# repeated runs see the same dead streams) answer 503 instead. With
+# `bandwidth` every response body is sent at that many bytes per second, for
+# the segment throughput probe.
+#
+#   /live/<n>/index.m3u8   master playlist with two variants
+#   /live/<n>/media.m3u8   media playlist with six 2 second segments
+#   /live/<n>/<k>.ts       a small MPEG-TS segment
+#   /raw/<n>.ts            a raw transport stream without manifest
+
+MASTER = '''#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=2500000,RESOLUTION=1280x720,CODECS="avc1.64001f,mp4a.40.2"
+media.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=5000000,RESOLUTION=1920x1080,CODECS="avc1.640028,mp4a.40.2"
+media.m3u8
+'''
+MEDIA = '#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:2\n#EXT-X-MEDIA-SEQUENCE:1\n' + ''.join(
+    f'#EXTINF:2.0,\n{segment}.ts\n' for segment in range(6))
+SEGMENT = b'\x47' + b'\xff' * 187
+SEND_CHUNK = 16 * 1024  # Bytes written between pauses when the bandwidth is limited
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        if random.Random(self.path.rsplit('/', 1)[0]).random() < self.server.failure_rate:
+            return 503, 'text/plain', b'unavailable'
+        if self.path.endswith('index.m3u8'):
+            return 200, 'application/vnd.apple.mpegurl', MASTER.encode()
+        if self.path.endswith('media.m3u8'):
+            return 200, 'application/vnd.apple.mpegurl', MEDIA.encode()
+        if self.path.endswith('.ts'):
+            return 200, 'video/mp2t', SEGMENT * self.server.segment_packets
+        return 404, 'text/plain', b'not found'
+
+    def _respond(self, send_body):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        status, content_type, body = self._body()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not send_body:
+            return
+        if not self.server.bandwidth:
+            self.wfile.write(body)
+            return
+        for start in range(0, len(body), SEND_CHUNK):
+            chunk = body[start:start + SEND_CHUNK]
+            try:
+                self.wfile.write(chunk)
+            except ConnectionError:  # Probes drop raw streams after the first chunk
+                return
+            time.sleep(len(chunk) / self.server.bandwidth)
+
+    def do_GET(self):
+        self._respond(True)
+
+    def do_HEAD(self):
+        self._respond(False)
+
+
+class MockServer(ThreadingHTTPServer):
+    # The benchmarks open up to a few hundred connections at once. With the
+    # default listen backlog of 5 the rest stall on SYN retransmits, and the
+    # benchmarks would time the accept queue instead of the client.
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start(latency=0.05, failure_rate=0.1, segment_packets=1000, port=0, bandwidth=None):
+    # Returns (server, base_url); the server runs in a daemon thread until
+    # server.shutdown() is called.
+    server = MockServer(('127.0.0.1', port), MockHandler)
+    server.latency = latency
+    server.failure_rate = failure_rate
+    server.segment_packets = segment_packets
+    server.bandwidth = bandwidth
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve mock HLS streams for the probe benchmarks.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds before every answer')
+    parser.add_argument('--failure-rate', type=float, default=0.1, help='share of streams answering 503')
+    parser.add_argument('--bandwidth', type=float, help='bytes per second of every response body')
+    args = parser.parse_args()
+    server, base_url = start(args.latency, args.failure_rate, port=args.port, bandwidth=args.bandwidth)
+    print(f'Serving {base_url}/live/<n>/index.m3u8, press Ctrl+C to stop')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+import m3u
+
+# Configuration values
+MANIFEST_PATH = 'build_manifest.sqlite3'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sources (
+    url TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    changed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+)
+'''
+
+
+def content_hash(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def hashed_lines(lines, digest):
+    # Feeds every line into `digest` as it is read
+    for line in lines:
+        digest.update(line.encode('utf-8') + b'\n')
+        yield line
+
+
+def entry_key(entry):
+    # Hash of the entry as read (EXTINF, options and URL), before any stage
+    # changed it
+    return content_hash('\n'.join(entry.lines()))
+
+
+def entry_state(entry, unmatched=None, unprobed_at=None):
+    # unprobed_at: when the probe stage left the entry unprobed on purpose, as
+    # a fallback of a channel that already had enough healthy mirrors
+    state = {field: getattr(entry, field) for field in ('duration', 'attrs', 'name', 'options', 'url')}
+    state['leading'] = list(entry.leading)
+    state['trailing'] = list(entry.trailing)
+    state.update((field, getattr(entry, field)) for field in m3u.PROBE_FIELDS)
+    state['unmatched'] = unmatched
+    state['unprobed_at'] = unprobed_at
+    return state
+
+
+def restore_entry(state):
+    # Returns (entry, unmatched) as recorded by entry_state
+    entry = m3u.Entry(state['duration'], state['attrs'], state['name'], state['options'], state['url'],
+                      state.get('leading', ()), state.get('trailing', ()))
+    for field in m3u.PROBE_FIELDS:
+        setattr(entry, field, state.get(field))  # Manifests of older versions lack newer fields
+    unmatched = tuple(state['unmatched']) if state['unmatched'] else None
+    return entry, unmatched
+
+
+class BuildManifest:
+    # Content hashes of every source and every entry of the last complete
+    # run, each entry with its results after standardization, EPG matching and
+    # probing. A later run restores unchanged entries from here and only sends
+    # new or changed ones through the expensive stages.
+    def __init__(self, path=MANIFEST_PATH):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def changed_sources(self, hashes):
+        # URLs or paths in {source: hash} whose content differs from the last run
+        stored = dict(self._connection.execute('SELECT url, hash FROM sources'))
+        return [source for source, digest in hashes.items() if stored.get(source) != digest]
+
+    def setting(self, name):
+        row = self._connection.execute('SELECT value FROM settings WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def lookup(self, key):
+        row = self._connection.execute('SELECT state FROM entries WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, records, source_hashes, settings):
+        # Replaces the manifest with the entries of this run, given as
+        # (key, state) pairs, in one transaction
+        now = time.time()
+        with self._connection:
+            self._connection.execute('DELETE FROM entries')
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO entries (key, state) VALUES (?, ?)',
+                ((key, json.dumps(state, ensure_ascii=False)) for key, state in records),
+            )
+            changed = self.changed_sources(source_hashes)
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO sources (url, hash, changed_at) VALUES (?, ?, ?)',
+                ((source, source_hashes[source], now) for source in changed),
+            )
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO settings (name, value) VALUES (?, ?)', settings.items())
+
+    def close(self):
+        self._connection.close()
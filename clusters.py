@@ -0,0 +1,72 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+
+import dedupe
+
+# Configuration values
+HEALTHY_MIRRORS = 3  # Mirrors per channel that have to answer before the rest are kept unprobed
+WORKERS = 100  # Channels probed at the same time
+
+BRACKETS = re.compile(r'\s*\[[^\]]*\]')
+QUALITY_TAGS = re.compile(r'\b(?:u?hd|fhd|sd|4k|8k|\d{3,4}[pi])\b')
+NON_WORD = re.compile(r'[\W_]+')
+
+
+def clean_channel_name(name):
+    return re.sub(r'\s*\([^)]*\)', '', name).strip().lower()
+
+
+def channel_name_key(name):
+    # "RCTI HD (1080p) [Not 24/7]" and "rcti" end up as the same key
+    name = BRACKETS.sub('', clean_channel_name(name))
+    name = QUALITY_TAGS.sub(' ', name)
+    return NON_WORD.sub(' ', name).strip()
+
+
+def cluster_entries(entries):
+    # Entries are grouped by normalized name, then split by tvg-id so two
+    # channels sharing a name stay apart. tvg-ids alone are not trusted to
+    # join clusters: sources reuse one id for unrelated channels. Entries
+    # without a tvg-id join their name's cluster when it has exactly one id.
+    # Returns lists of entries in input order.
+    by_name = {}
+    for entry in entries:
+        name_key = channel_name_key(entry.name) or entry.url
+        by_name.setdefault(name_key, {}).setdefault(entry.tvg_id.strip().lower(), []).append(entry)
+
+    positions = {id(entry): position for position, entry in enumerate(entries)}
+    clusters = []
+    for by_id in by_name.values():
+        if len(by_id) == 2 and '' in by_id:
+            clusters.append(sorted((entry for group in by_id.values() for entry in group),
+                                   key=lambda entry: positions[id(entry)]))
+        else:
+            clusters.extend(by_id.values())
+    return clusters
+
+
+def probe_clusters(entries, probe, healthy=HEALTHY_MIRRORS, workers=WORKERS, cache=None,
+                   is_healthy=lambda result: result is not None, desc="Probing channels"):
+    # Mirrors of a channel are probed one after another, fastest cached result
+    # first and otherwise in playlist order, until `healthy` of them pass
+    # is_healthy. Returns [(entry, result)] in input order; result is None
+    # for fallbacks that were never probed.
+    entries = list(entries)
+    results = {}
+
+    def probe_cluster(cluster):
+        found = 0
+        for entry in sorted(cluster, key=lambda entry: dedupe.response_time(entry, cache)):
+            if found >= healthy:
+                break
+            result = probe(entry)
+            results[id(entry)] = result
+            if is_healthy(result):
+                found += 1
+
+    clusters = cluster_entries(entries)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in tqdm(executor.map(probe_cluster, clusters), total=len(clusters), desc=desc):
+            pass
+    return [(entry, results.get(id(entry))) for entry in entries]
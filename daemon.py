@@ -0,0 +1,307 @@
+import gzip
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import net
+import probe
+import report
+from clusters import channel_name_key, cluster_entries
+
+# Configuration values
+HOST = '127.0.0.1'  # Address the playlist endpoint listens on
+PORT = 8080
+REPROBE_INTERVAL = 6 * 3600  # Seconds between probes of a healthy channel
+POPULAR_INTERVAL = 2 * 3600  # Seconds between probes of a channel with at least POPULAR_MIRRORS mirrors
+FAILING_INTERVAL = 15 * 60  # Seconds between probes of a channel whose last probe failed
+POPULAR_MIRRORS = 3  # Mirrors of one channel name that make it popular
+REPROBE_WORKERS = 16  # Streams re-probed at the same time
+REBUILD_DELAY = 30  # Seconds probe results are collected before the outputs are rebuilt
+REFRESH_INTERVAL = 24 * 3600  # Seconds between full runs from the sources; None to only re-probe
+
+
+class Snapshot:
+    # One rendered output with its gzip body and strong ETags, built once per
+    # rebuild and shared by every request until the next one
+    __slots__ = ('body', 'gzip_body', 'etag', 'gzip_etag', 'content_type', 'built_at')
+
+    def __init__(self, text, content_type):
+        self.body = text.encode('utf-8')
+        self.gzip_body = gzip.compress(self.body)
+        digest = hashlib.blake2b(self.body, digest_size=16).hexdigest()
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gz"'
+        self.content_type = content_type
+        self.built_at = time.time()
+
+
+class Catalog:
+    # The entries of the last full run, updated in place by the re-prober.
+    # render(entries) returns the playlist text and publish(entries), when
+    # given, writes the output files; rebuild() swaps in new snapshots of the
+    # playlist and the report in one assignment.
+    def __init__(self, entries, render, publish=None):
+        self.render = render
+        self.publish = publish
+        self.lock = threading.Lock()
+        self.entries = entries
+        self.files = {}
+        self.changed = threading.Event()
+        self.rebuild(publish=False)
+
+    def replace(self, entries):
+        # After a full run, which has written its own outputs
+        with self.lock:
+            self.entries = entries
+        self.rebuild(publish=False)
+
+    def apply(self, entry, result):
+        with self.lock:
+            result.apply(entry)
+        self.changed.set()
+
+    def rebuild(self, publish=True):
+        self.changed.clear()
+        with self.lock:
+            playlist = self.render(self.entries)
+            rows = [report.report_row(entry) for entry in self.entries]
+            if publish and self.publish is not None:
+                try:
+                    self.publish(self.entries)  # Under the lock, so the files match the snapshots
+                except OSError as e:
+                    logging.error(f'Error writing the outputs, serving the rebuilt playlist anyway: {e}')
+        self.files = {
+            '/playlist.m3u': Snapshot(playlist, 'audio/x-mpegurl; charset=utf-8'),
+            '/report.json': Snapshot(json.dumps(rows, ensure_ascii=False), 'application/json; charset=utf-8'),
+        }
+        logging.info(f'Rebuilt playlist with {len(rows)} entries')
+
+
+class Reprober:
+    # Re-probes every entry on its own schedule: failing channels every
+    # FAILING_INTERVAL, channels with many mirrors every POPULAR_INTERVAL and
+    # the rest every REPROBE_INTERVAL, counted from their last check. Due
+    # entries come off a heap ordered by due time. With healthy_mirrors, the
+    # fallbacks the probe stage left unprobed are not scheduled; one is only
+    # probed when its channel has fewer than healthy_mirrors working mirrors.
+    def __init__(self, catalog, workers=REPROBE_WORKERS, health=None, segments=0, healthy_mirrors=None):
+        self.catalog = catalog
+        self.workers = workers
+        self.health = health
+        self.segments = segments
+        self.healthy_mirrors = healthy_mirrors
+        self.session = net.make_session(workers)
+        self.limits = probe.ProbeLimits()
+        self._heap = []
+        self._sequence = itertools.count()
+        self._popular = set()
+        self._clusters = {}  # Entry -> the mirrors of its channel
+        self._promoted = set()  # Fallbacks scheduled for a first probe
+        self._generation = 0  # Bumped by schedule_all; results for older catalogs are dropped
+        self._lock = threading.Lock()
+        self.schedule_all(catalog.entries)
+
+    def interval(self, entry):
+        if entry.latency is None:
+            return FAILING_INTERVAL
+        if channel_name_key(entry.name) in self._popular:
+            return POPULAR_INTERVAL
+        return REPROBE_INTERVAL
+
+    def schedule_all(self, entries):
+        mirrors = Counter(channel_name_key(entry.name) for entry in entries)
+        clusters = {}
+        if self.healthy_mirrors:
+            clusters = {entry: cluster for cluster in cluster_entries(entries) for entry in cluster}
+        now = time.time()
+        with self._lock:
+            self._generation += 1
+            self._popular = {key for key, count in mirrors.items() if count >= POPULAR_MIRRORS}
+            self._clusters = clusters
+            self._promoted = set()
+            self._heap = [((entry.checked_at or now) + self.interval(entry), next(self._sequence), entry)
+                          for entry in entries if entry.checked_at is not None or not clusters]
+            heapq.heapify(self._heap)
+        due = sum(1 for item in self._heap if item[0] <= now)
+        logging.info(f'Scheduled {len(entries)} entries for re-probing, {due} due now')
+
+    def _schedule(self, entry):
+        with self._lock:
+            due = (entry.checked_at or time.time()) + self.interval(entry)
+            heapq.heappush(self._heap, (due, next(self._sequence), entry))
+            self._promoted.discard(entry)
+
+    def _promote_fallback(self, entry):
+        # After a failed probe: schedules the next unprobed mirror of the
+        # channel right away when too few of its mirrors work
+        with self._lock:
+            cluster = self._clusters.get(entry, ())
+            if sum(1 for mirror in cluster if mirror.latency is not None) >= self.healthy_mirrors:
+                return
+            for mirror in cluster:
+                if mirror.checked_at is None and mirror not in self._promoted:
+                    self._promoted.add(mirror)
+                    heapq.heappush(self._heap, (time.time(), next(self._sequence), mirror))
+                    return
+
+    def _next_due(self):
+        # Pops the next due (entry, generation), or returns the seconds until
+        # one is due
+        with self._lock:
+            if not self._heap:
+                return None, REPROBE_INTERVAL
+            due, _, entry = self._heap[0]
+            if due > time.time():
+                return None, due - time.time()
+            heapq.heappop(self._heap)
+            return (entry, self._generation), 0
+
+    def _probe(self, entry):
+        url, headers = entry.http_request()
+        # No cache: a re-probe has to measure the stream again
+        return probe.probe_stream(self.session, url, headers, limits=self.limits, health=self.health,
+                                  segments=self.segments)
+
+    def run(self, stop):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            running = {}
+            while not stop.is_set():
+                while len(running) < self.workers:
+                    item, delay = self._next_due()
+                    if item is None:
+                        break
+                    running[executor.submit(self._probe, item[0])] = item
+                if not running:
+                    stop.wait(min(delay, REBUILD_DELAY))
+                    continue
+                done, _ = wait(running, timeout=1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    entry, generation = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logging.error(f'Error re-probing {entry.url}: {e}')
+                        result = probe.StreamProbe(False, checked_at=time.time())
+                    if generation == self._generation:
+                        self.catalog.apply(entry, result)
+                        self._schedule(entry)
+                        if self._clusters and result.latency is None:
+                            self._promote_fallback(entry)
+
+
+def accepts_gzip(accept_encoding):
+    # Whether an Accept-Encoding header allows gzip: listed (or covered by
+    # '*') with a q-value above 0, so 'gzip;q=0' turns it off
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, *params = item.split(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    for coding in ('gzip', 'x-gzip', '*'):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+class PlaylistHandler(BaseHTTPRequestHandler):
+    # GET/HEAD /playlist.m3u (also /) and /report.json, with If-None-Match
+    # and gzip Content-Encoding
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logging.debug(f'{self.address_string()} {format % args}')
+
+    def _respond(self, send_body):
+        path = urlsplit(self.path).path
+        snapshot = self.server.catalog.files.get('/playlist.m3u' if path == '/' else path)
+        if snapshot is None:
+            self.send_error(404)
+            return
+        compressed = accepts_gzip(self.headers.get('Accept-Encoding', ''))
+        etag = snapshot.gzip_etag if compressed else snapshot.etag
+        if_none_match = [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]
+        if etag in if_none_match or '*' in if_none_match:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        body = snapshot.gzip_body if compressed else snapshot.body
+        self.send_response(200)
+        self.send_header('Content-Type', snapshot.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', self.date_time_string(snapshot.built_at))
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        if compressed:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond(True)
+
+    def do_HEAD(self):
+        self._respond(False)
+
+
+def start_server(catalog, host=HOST, port=PORT):
+    # Returns (server, base_url); the server runs in a daemon thread until
+    # server.shutdown() is called.
+    server = ThreadingHTTPServer((host, port), PlaylistHandler)
+    server.daemon_threads = True
+    server.catalog = catalog
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+
+def serve(catalog, host=HOST, port=PORT, refresh=None, refresh_interval=REFRESH_INTERVAL, workers=REPROBE_WORKERS,
+          health=None, segments=0, healthy_mirrors=None):
+    # Serves the catalog and keeps it fresh until interrupted. refresh(),
+    # when given, returns the entries of a new full run from the sources.
+    server, base_url = start_server(catalog, host, port)
+    logging.info(f'Serving {base_url}/playlist.m3u and {base_url}/report.json')
+    reprober = Reprober(catalog, workers, health, segments, healthy_mirrors)
+    stop = threading.Event()
+    threading.Thread(target=reprober.run, args=(stop,), daemon=True).start()
+    refreshed_at = time.monotonic()
+    try:
+        while True:
+            if catalog.changed.wait(REBUILD_DELAY):
+                time.sleep(REBUILD_DELAY)  # Collect more results before rebuilding
+                catalog.rebuild()
+            if refresh is not None and refresh_interval and time.monotonic() - refreshed_at >= refresh_interval:
+                logging.info('Refreshing the catalog from its sources')
+                refreshed_at = time.monotonic()
+                try:
+                    entries = refresh()
+                except Exception as e:
+                    # The last good catalog stays up; the next interval tries again
+                    logging.error(f'Error refreshing the catalog, serving the previous one: {e}')
+                    continue
+                catalog.replace(entries)
+                reprober.schedule_all(catalog.entries)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.shutdown()
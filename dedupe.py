@@ -0,0 +1,77 @@
+import m3u
+from url_utils import url_hash
+
+# Configuration values
+POLICY = 'first'  # Entry kept for a duplicate stream: 'first', 'last' or 'best'
+POLICIES = ('first', 'last', 'best')
+
+
+def entry_key(entry):
+    # Normalized stream URL plus any Kodi '|Header=value' request headers
+    url, headers = m3u.split_url_headers(entry.url)
+    return url_hash(url, headers)
+
+
+def response_time(entry, cache=None):
+    if entry.latency is not None:
+        return entry.latency
+    if cache is not None:
+        hit, value = cache.get(entry.http_request()[0], 'response_time')
+        if hit and value is not None:
+            return value
+    return float('inf')
+
+
+def score(entry, cache=None):
+    # Higher is better: a filled tvg-id first, then the faster stream
+    return (bool(entry.tvg_id.strip()), -response_time(entry, cache))
+
+
+def _kodiprop_key(option):
+    return option.partition('=')[0]
+
+
+def merge_options(kept, duplicate):
+    # #KODIPROP lines of the dropped entry that the kept one does not set yet
+    present = {_kodiprop_key(option) for option in kept.option_lines() if option.startswith('#KODIPROP:')}
+    for option in duplicate.option_lines():
+        if option.startswith('#KODIPROP:') and _kodiprop_key(option) not in present:
+            kept.options.append(option)
+            present.add(_kodiprop_key(option))
+
+
+def _first(entries):
+    seen = set()
+    for entry in entries:
+        key = entry_key(entry)
+        if key not in seen:
+            seen.add(key)
+            yield entry
+
+
+def deduplicate(entries, policy=POLICY, cache=None):
+    # 'first' streams and never looks back. 'last' and 'best' hold the kept
+    # entries until the input is exhausted, merge the #KODIPROP lines of every
+    # duplicate into them and emit them in order of first appearance.
+    if policy not in POLICIES:
+        raise ValueError(f'unknown dedupe policy: {policy}')
+    if policy == 'first':
+        yield from _first(entries)
+        return
+
+    kept = []
+    positions = {}
+    for entry in entries:
+        key = entry_key(entry)
+        position = positions.get(key)
+        if position is None:
+            positions[key] = len(kept)
+            kept.append(entry)
+            continue
+        current = kept[position]
+        if policy == 'last' or score(entry, cache) > score(current, cache):
+            merge_options(entry, current)
+            kept[position] = entry
+        else:
+            merge_options(current, entry)
+    yield from kept
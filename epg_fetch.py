@@ -0,0 +1,116 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from tqdm import tqdm
+
+import metrics
+import net
+import xmltv
+
+# Configuration values
+SNAPSHOT_DIR = 'epg_snapshots'  # Last body and parsed channel index of every EPG source
+TIMEOUT = 30  # Timeout for fetching one EPG source
+MAX_WORKERS = 16  # EPG sources downloaded and parsed in parallel
+
+
+class SnapshotStore:
+    # One '<key>.xml' body and one '<key>.json' metadata file per source. The
+    # metadata holds the validators for conditional requests and the parsed
+    # display-name -> tvg-id index, so a 304 answer needs no parsing at all.
+    def __init__(self, directory=SNAPSHOT_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url, suffix):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.directory, key + suffix)
+
+    def load(self, url):
+        try:
+            with open(self._path(url, '.json'), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def body_writer(self):
+        return tempfile.NamedTemporaryFile(dir=self.directory, suffix='.part', delete=False)
+
+    def save(self, url, body_path, etag, last_modified, index):
+        os.replace(body_path, self._path(url, '.xml'))
+        meta = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': time.time(),
+            'index': index,
+        }
+        meta_path = self._path(url, '.json')
+        with open(meta_path + '.part', 'w', encoding='utf-8') as file:
+            json.dump(meta, file, ensure_ascii=False)
+        os.replace(meta_path + '.part', meta_path)
+
+
+def _tee(chunks, file):
+    for chunk in chunks:
+        file.write(chunk)
+        yield chunk
+
+
+def fetch_channel_index(session, url, store, timeout=TIMEOUT):
+    # Returns the {display name: tvg-id} index of one EPG source, downloading
+    # and parsing it only when the server reports a change.
+    meta = store.load(url)
+    headers = {}
+    if meta:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    body = None
+    index = {}
+    try:
+        with net.get(session, url, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 304 and meta:
+                metrics.count('epg_fetches', source=url, outcome='not_modified')
+                logging.info(f"EPG not modified, reusing snapshot of {url}")
+                return meta['index']
+            response.raise_for_status()
+            with store.body_writer() as body:
+                for tvg_id, display_names in xmltv.iter_channels(_tee(response.iter_content(xmltv.CHUNK_SIZE), body)):
+                    for display_name in display_names:
+                        index[display_name.lower()] = tvg_id
+            metrics.count('source_bytes', response.raw.tell(), source=url)
+            metrics.count('epg_fetches', source=url, outcome='downloaded')
+            store.save(url, body.name, response.headers.get('ETag'), response.headers.get('Last-Modified'), index)
+            return index
+    except (requests.RequestException, ET.ParseError, zlib.error, OSError) as e:
+        if body is not None and os.path.exists(body.name):
+            os.remove(body.name)
+        metrics.count('epg_fetches', source=url, outcome='error')
+        if meta:
+            logging.error(f"Error fetching EPG from {url}, using snapshot from {time.ctime(meta['fetched_at'])}: {e}")
+            return meta['index']
+        logging.error(f"Error fetching standard tvg-ids from {url}, keeping {len(index)} names read so far: {e}")
+        return index
+
+
+def fetch_all(epg_urls, store=None, session=None, max_workers=MAX_WORKERS, timeout=TIMEOUT):
+    # Sources are fetched and parsed in parallel but merged in the configured
+    # order, so later sources win on duplicate display names on every run.
+    store = store or SnapshotStore()
+    session = session or net.make_session(max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(lambda url: fetch_channel_index(session, url, store, timeout), epg_urls)
+        tvg_ids = {}
+        for index in tqdm(results, total=len(epg_urls), desc="Fetching EPG data"):
+            tvg_ids.update(index)
+    return tvg_ids
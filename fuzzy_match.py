@@ -0,0 +1,142 @@
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+# Configuration values
+MIN_SCORE = 0.75  # Names that cannot reach this similarity are never scored
+
+
+def char_slots(text):
+    # (character, n) for the n-th occurrence of each character, so two strings
+    # have as many slots in common as quick_ratio counts matching characters
+    seen = Counter()
+    slots = []
+    for char in text:
+        seen[char] += 1
+        slots.append((char, seen[char]))
+    return slots
+
+
+def _bound(matches, total):
+    # The ratio formula of SequenceMatcher, so bounds compare exactly with scores
+    return 2.0 * matches / total if total else 1.0
+
+
+def _needed(score, total):
+    # Fewest matching characters that reach `score` for strings of `total` length
+    matches = max(0, int(score * total / 2) - 1)
+    while _bound(matches, total) < score:
+        matches += 1
+    return matches
+
+
+def _bitmask(positions, size):
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _count_planes(masks):
+    # Adds up bitmasks bit-sliced: bit p of planes[i] is bit i of the number of
+    # masks that have bit p set
+    planes = []
+    for carry in masks:
+        for i, plane in enumerate(planes):
+            planes[i] = plane ^ carry
+            carry &= plane
+            if not carry:
+                break
+        if carry:
+            planes.append(carry)
+    return planes
+
+
+def _at_least(planes, count, within):
+    # The bits of `within` whose count in planes is at least `count`
+    if count <= 0:
+        return within
+    if count.bit_length() > len(planes):
+        return 0
+    greater, equal = 0, within
+    for i in reversed(range(len(planes))):
+        if count >> i & 1:
+            equal &= planes[i]
+        else:
+            greater |= equal & planes[i]
+            equal &= ~planes[i]
+    return greater | equal
+
+
+class NameIndex:
+    # Finds the same best match as comparing the query against every name with
+    # SequenceMatcher, for every similarity from min_score up, but only scores
+    # names that can reach min_score. A name never scores higher than the
+    # characters it shares with the query allow (the bound of quick_ratio), so
+    # the index keeps a bitmask over all names per character occurrence and
+    # per name length. Adding up the query's masks bit-sliced gives the shared
+    # character count of every name at once.
+    def __init__(self, names, min_score=MIN_SCORE):
+        self.min_score = min_score
+        self.names = []
+        self.positions = {}
+        slot_positions = defaultdict(list)
+        length_positions = defaultdict(list)
+        for name in names:
+            if name in self.positions:
+                continue
+            position = len(self.names)
+            self.positions[name] = position
+            self.names.append(name)
+            for slot in char_slots(name):
+                slot_positions[slot].append(position)
+            length_positions[len(name)].append(position)
+        size = len(self.names)
+        self.slot_masks = {slot: _bitmask(positions, size) for slot, positions in slot_positions.items()}
+        self.length_masks = {length: _bitmask(positions, size) for length, positions in length_positions.items()}
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def candidates(self, query):
+        # Positions, in insertion order, of the names that share enough
+        # characters with the query to reach min_score
+        query_length = len(query)
+        slot_masks = self.slot_masks
+        planes = _count_planes(slot_masks[slot] for slot in char_slots(query) if slot in slot_masks)
+        by_needed = defaultdict(int)
+        for length, mask in self.length_masks.items():
+            total = query_length + length
+            if _bound(min(query_length, length), total) >= self.min_score:
+                by_needed[_needed(self.min_score, total)] |= mask
+        found = 0
+        for needed, mask in by_needed.items():
+            found |= _at_least(planes, needed, mask)
+        positions = []
+        while found:
+            lowest = found & -found
+            positions.append(lowest.bit_length() - 1)
+            found ^= lowest
+        return positions
+
+    def best_match(self, query):
+        # Returns (name, similarity) like a linear scan with SequenceMatcher would:
+        # the first name in insertion order wins ties. Below min_score the
+        # result is (None, 0) or a weaker match than the scan's.
+        if query in self._cache:
+            return self._cache[query]
+        if query in self.positions:
+            result = (query, 1.0)
+        else:
+            best_match, best_similarity = None, 0
+            for position in self.candidates(query):
+                name = self.names[position]
+                matcher = SequenceMatcher(None, query, name)
+                if matcher.real_quick_ratio() <= best_similarity or matcher.quick_ratio() <= best_similarity:
+                    continue
+                similarity = matcher.ratio()
+                if similarity > best_similarity:
+                    best_match, best_similarity = name, similarity
+            result = (best_match, best_similarity)
+        self._cache[query] = result
+        return result
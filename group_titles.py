@@ -0,0 +1,105 @@
+import json
+import os
+from collections import deque
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'group_titles.json')
+
+
+class KeywordMatcher:
+    # Aho-Corasick automaton over lowercased keywords. first() scans the text
+    # once and returns the value of the matching keyword with the lowest
+    # priority, i.e. the same answer as trying the keywords one by one in order
+    # with `keyword.lower() in text.lower()`.
+    def __init__(self, keywords):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [None]
+        for priority, (keyword, value) in enumerate(keywords):
+            self._add(keyword.lower(), priority, value)
+        self._link()
+
+    def _add(self, keyword, priority, value):
+        if not keyword:
+            return
+        node = 0
+        for char in keyword:
+            next_node = self.goto[node].get(char)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][char] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(None)
+            node = next_node
+        if self.out[node] is None or priority < self.out[node][0]:
+            self.out[node] = (priority, value)
+
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                inherited = self.out[self.fail[child]]
+                if inherited is not None and (self.out[child] is None or inherited[0] < self.out[child][0]):
+                    self.out[child] = inherited
+
+    def first(self, text, default=None):
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        best = None
+        for char in text.lower():
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            found = out[node]
+            if found is not None and (best is None or found[0] < best[0]):
+                best = found
+                if best[0] == 0:
+                    break
+        return best[1] if best is not None else default
+
+
+class GroupTitleRules:
+    def __init__(self, translations, standard_group_titles, country_names):
+        self.translations = KeywordMatcher(translations.items())
+        self.standard_titles = KeywordMatcher(
+            (keyword, standard_title)
+            for standard_title, keywords in standard_group_titles.items()
+            for keyword in keywords
+        )
+        self.countries = KeywordMatcher((country, 'International') for country in country_names)
+        self._cache = {}
+
+    @classmethod
+    def load(cls, path=RULES_PATH):
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        return cls(data['translations'], data['standard_group_titles'], data['country_names'])
+
+    def standardize(self, group_title):
+        # Memoized: a catalog only has a few hundred distinct group titles
+        standardized_title = self._cache.get(group_title)
+        if standardized_title is None:
+            english_title = self.translations.first(group_title, group_title)
+            standardized_title = self.countries.first(english_title) or self.standard_titles.first(english_title, english_title)
+            self._cache[group_title] = standardized_title
+        return standardized_title
+
+
+_rules = None
+
+
+def default_rules():
+    global _rules
+    if _rules is None:
+        _rules = GroupTitleRules.load()
+    return _rules
+
+
+def standardize(group_title):
+    return default_rules().standardize(group_title)
@@ -0,0 +1,104 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import metrics
+from url_utils import url_authority
+
+# Configuration values
+HEALTH_PATH = 'host_health.json'  # Host states kept across runs
+FAILURE_THRESHOLD = 5  # Consecutive failures that open the circuit of a host
+RETRY_AFTER = 60  # Seconds before a host with an open circuit gets its first trial request
+MAX_RETRY_AFTER = 6 * 3600  # Upper bound for the wait, which doubles after every failed trial
+FORGET_AFTER = 7 * 24 * 3600  # Hosts not seen for this long are dropped from the file
+
+
+def host_failed(status):
+    # Connection errors and timeouts (no status) and server errors count
+    # against the host; any other answer means it is up
+    return status is None or status >= 500
+
+
+class HostHealth:
+    # Per-host circuit breaker, keyed by host and port. After FAILURE_THRESHOLD
+    # consecutive failures the circuit opens and allow() refuses the host's
+    # URLs. Once the wait has passed, a single trial request is let through:
+    # success closes the circuit, failure reopens it for twice as long (up to
+    # MAX_RETRY_AFTER).
+    def __init__(self, path=HEALTH_PATH, failure_threshold=FAILURE_THRESHOLD):
+        self.path = path
+        self.failure_threshold = failure_threshold
+        self._lock = threading.Lock()
+        self._hosts = {}
+        self._trials = set()
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    self._hosts = json.load(file)
+            except (OSError, ValueError) as e:
+                logging.error(f'Error reading host health from {path}, starting fresh: {e}')
+        open_hosts = sum(1 for state in self._hosts.values() if state.get('open_until'))
+        if open_hosts:
+            logging.info(f'{open_hosts} hosts are known to be down from earlier runs')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.save()
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = {'failures': 0, 'open_until': None, 'retry_after': RETRY_AFTER}
+        state['seen_at'] = time.time()
+        return state
+
+    def allow(self, url):
+        host = url_authority(url)
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None or not state['open_until']:
+                return True
+            if time.time() >= state['open_until'] and host not in self._trials:
+                self._trials.add(host)
+                return True
+        if metrics.ENABLED:
+            metrics.count('short_circuited', host=host)
+        return False
+
+    def record(self, url, status):
+        host = url_authority(url)
+        failed = host_failed(status)
+        with self._lock:
+            state = self._state(host)
+            trial = host in self._trials
+            self._trials.discard(host)
+            if not failed:
+                if state['open_until']:
+                    logging.info(f'Host {host} is answering again, closing its circuit')
+                state.update(failures=0, open_until=None, retry_after=RETRY_AFTER)
+                return
+            state['failures'] += 1
+            if trial:
+                state['retry_after'] = min(state['retry_after'] * 2, MAX_RETRY_AFTER)
+            elif state['open_until'] or state['failures'] < self.failure_threshold:
+                return
+            else:
+                logging.warning(f'Host {host} failed {state["failures"]} times in a row, skipping its URLs '
+                                f'for {state["retry_after"]}s')
+            state['open_until'] = time.time() + state['retry_after']
+        if metrics.ENABLED:
+            metrics.count('circuit_opened', host=host)
+
+    def save(self):
+        if not self.path:
+            return
+        cutoff = time.time() - FORGET_AFTER
+        with self._lock:
+            hosts = {host: state for host, state in self._hosts.items() if state.get('seen_at', 0) >= cutoff}
+        with open(self.path + '.part', 'w', encoding='utf-8') as file:
+            json.dump(hosts, file, ensure_ascii=False)
+        os.replace(self.path + '.part', self.path)
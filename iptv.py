@@ -0,0 +1,473 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import nullcontext
+
+import build_manifest
+import clusters
+import daemon
+import dedupe
+import epg_fetch
+import host_health
+import liveness
+import m3u
+import metrics
+import pipeline
+import playlist_fetch
+import playlist_writer
+import probe_cache
+import report
+import stages
+import throughput
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Configuration values (every key can be set in the --config JSON file)
+DEFAULTS = {
+    'sources': [],  # Playlist URLs to download
+    'inputs': [],  # Local playlist files, read after the sources
+    'epg_urls': [],  # XMLTV guides used by epg-match
+    'output': 'Output EPG.txt',
+    'stages': ['fetch', 'clean', 'dedupe', 'restore', 'standardize', 'epg-fetch', 'epg-match', 'probe', 'sort', 'write'],
+    'dedupe_policy': dedupe.POLICY,  # 'first', 'last' or 'best'
+    'intermediate_dir': None,  # Write the entry set after every stage here; None to keep it in memory only
+    'probe_cache': 'probe_cache.sqlite3',  # None to probe everything again
+    'host_health': host_health.HEALTH_PATH,  # Hosts that keep failing are skipped until they answer again; None to try every URL
+    'probe_workers': stages.FFPROBE_WORKERS,
+    'healthy_mirrors': clusters.HEALTHY_MIRRORS,  # Mirrors probed per channel until this many answer; None to probe every entry
+    'throughput_segments': stages.THROUGHPUT_SEGMENTS,  # HLS segments downloaded per stream to measure playability; 0 to skip
+    'min_playability': stages.MIN_PLAYABILITY,  # sort drops entries measured below this playability (0 to 1); None to keep all
+    'check_timeout': 10,  # Timeout for the optional liveness check stage
+    'similarity_threshold': 0.80,  # Minimum EPG name similarity for epg-match
+    'match_processes': stages.MATCH_PROCESSES,  # Worker processes for epg-match; 1 matches in the main process
+    'write_attributes': ['tvg-name', 'tvg-id', 'tvg-logo', 'group-title'],  # None to keep every attribute
+    'name_template': '{name} ({latency:.1f}s)',  # Channel name as written; fields: latency, ttfb, resolution, codec, bitrate, playability
+    'report': None,  # Probe results per entry as .csv or .json; None to skip
+    'metrics': None,  # JSON run report with time per stage and probe/fetch counters; None to skip
+    'prometheus': None,  # The same numbers as a Prometheus textfile (.prom); None to skip
+    'sort_order': list(stages.SORT_ORDER),  # Sort keys in priority order: group, tvg-id, resolution, latency, playability, name
+    'group_headers': True,  # Start every group with a "# --- Group ---" line
+    'compress': False,  # Also write a gzip copy of every playlist (<name>.gz)
+    'split_by': None,  # 'group' or 'country' to also write one playlist per group or country
+    'split_dir': None,  # Directory of the split playlists; None for the output directory
+    'serve': None,  # "HOST:PORT" to keep running after the first run: re-probe on a schedule and serve the playlist
+    'refresh_interval': daemon.REFRESH_INTERVAL,  # Seconds between full runs in serve mode; None to only re-probe
+    'incremental': None,  # Build manifest path; entries unchanged since the last run skip standardize, probe and epg-match
+}
+
+
+class Run:
+    # Shared state of one pipeline run. Stages read the entry list and other
+    # results from here and return the keys they replace.
+    def __init__(self, config, cache=None, manifest=None, health=None):
+        self.config = config
+        self.cache = cache
+        self.manifest = manifest
+        self.health = health
+        self.entries = []
+        self.tvg_ids = {}
+        self.unmatched_entries = []
+        # Incremental runs only
+        self.source_hashes = {}
+        self.settings_hash = None
+        self.epg_hash = None
+        self.restored = []  # Unchanged entries set aside by restore, merged back by sort
+        self.positions = {}  # Entry -> position before restore split the list
+        self.entry_keys = {}  # Entry -> content hash as read
+        self.unmatched_by_entry = {}
+        self.unprobed_at = {}  # Restored fallback -> when the probe stage first left it unprobed
+        self.source_tvg_ids = {}  # Restored entry -> tvg-id as read, None when it had none
+
+
+def read_source(run, name, lines):
+    # Content hashes of the sources are only needed by incremental runs
+    if run.manifest is None:
+        return list(m3u.iter_entries(lines))
+    digest = hashlib.blake2b(digest_size=16)
+    entries = list(m3u.iter_entries(build_manifest.hashed_lines(lines, digest)))
+    run.source_hashes[name] = digest.hexdigest()
+    return entries
+
+
+def fetch(run):
+    entries = []
+    for url, spool, error in playlist_fetch.fetch_all(run.config['sources'], clean=stages.clean_playlist_lines):
+        if error is not None:
+            logging.error(f'Error fetching playlist from {url}: {error}')
+            continue
+        with spool:
+            entries.extend(read_source(run, url, spool))
+    for path in run.config['inputs']:
+        with open(path, 'r', encoding='utf-8') as file:
+            entries.extend(read_source(run, path, file))
+    if run.manifest is not None:
+        changed = run.manifest.changed_sources(run.source_hashes)
+        logging.info(f'{len(changed)} of {len(run.source_hashes)} sources changed since the last run')
+    return {'entries': entries}
+
+
+def clean(run):
+    return {'entries': list(pipeline.apply(run.entries, stages.format_group_title))}
+
+
+def dedupe_stage(run):
+    return {'entries': list(dedupe.deduplicate(run.entries, run.config['dedupe_policy'], run.cache))}
+
+
+def check(run):
+    entries = liveness.check_and_filter_entries(run.entries, timeout=run.config['check_timeout'], cache=run.cache,
+                                                health=run.health)
+    return {'entries': list(entries)}
+
+
+def _restorable(state, selected, now):
+    # Probe results are trusted as long as the probe cache would trust them.
+    # Fallbacks left unprobed are kept as long as a healthy result, so they
+    # come back together with the mirrors that made them fallbacks.
+    if 'probe' not in selected:
+        return True
+    if state['checked_at'] is None:
+        unprobed_at = state.get('unprobed_at')  # Manifests of older versions lack it
+        return unprobed_at is not None and now - unprobed_at <= probe_cache.TTL['response_time']
+    ttl = probe_cache.TTL['response_time'] if state['latency'] is not None else probe_cache.FAILURE_TTL
+    return now - state['checked_at'] <= ttl
+
+
+def restore(run):
+    # Incremental runs: entries unchanged since the last run get their
+    # standardized, matched and probed state back from the build manifest and
+    # wait for sort; only new and changed entries go through the stages below.
+    # Everything is redone when the settings changed; epg-match handles
+    # changed EPG data itself.
+    if run.manifest is None:
+        return {}
+    selected = run.config['stages']
+    settings = {
+        'stages': [name for name in ('standardize', 'probe', 'epg-match') if name in selected],
+        'similarity_threshold': run.config['similarity_threshold'],
+        'healthy_mirrors': run.config['healthy_mirrors'],
+        'throughput_segments': run.config['throughput_segments'],
+        'min_playability': run.config['min_playability'],
+    }
+    settings_hash = build_manifest.content_hash(json.dumps(settings, sort_keys=True))
+    reuse = run.manifest.setting('settings') == settings_hash
+    if not reuse:
+        logging.info('Settings changed since the last run, processing every entry')
+
+    now = time.time()
+    pending = []
+    restored = []
+    positions = {}
+    entry_keys = {}
+    unmatched_by_entry = {}
+    unprobed_at = {}
+    source_tvg_ids = {}
+    for position, entry in enumerate(run.entries):
+        key = build_manifest.entry_key(entry)
+        state = run.manifest.lookup(key) if reuse else None
+        if state is not None and _restorable(state, selected, now):
+            source_tvg_id = entry.attrs.get('tvg-id')
+            entry, unmatched = build_manifest.restore_entry(state)
+            source_tvg_ids[entry] = source_tvg_id
+            restored.append(entry)
+            if unmatched:
+                unmatched_by_entry[entry] = unmatched
+            if state.get('unprobed_at') is not None:
+                unprobed_at[entry] = state['unprobed_at']
+        else:
+            pending.append(entry)
+        positions[entry] = position
+        entry_keys[entry] = key
+    logging.info(f'Restored {len(restored)} unchanged entries, {len(pending)} left to process')
+    return {'entries': pending, 'restored': restored, 'positions': positions, 'entry_keys': entry_keys,
+            'unmatched_by_entry': unmatched_by_entry, 'unprobed_at': unprobed_at, 'source_tvg_ids': source_tvg_ids,
+            'settings_hash': settings_hash}
+
+
+def standardize(run):
+    return {'entries': list(stages.standardize_group_titles(run.entries))}
+
+
+def probe(run):
+    # Runs after epg-match: mirrors are clustered by the tvg-ids it fills in
+    config = run.config
+    for _ in stages.probe_entries(run.entries, run.cache, config['probe_workers'], config['healthy_mirrors'], run.health,
+                                  config['throughput_segments'], config['min_playability']):
+        pass
+    return {}
+
+
+def epg_fetch_stage(run):
+    return {'tvg_ids': epg_fetch.fetch_all(run.config['epg_urls'])}
+
+
+def epg_match(run):
+    if run.manifest is None:
+        _, unmatched_entries = stages.update_tvg_ids(run.entries, run.tvg_ids, run.config['similarity_threshold'],
+                                                     processes=run.config['match_processes'])
+        return {'unmatched_entries': unmatched_entries}
+
+    # Restored entries keep their match unless the EPG data changed
+    epg_hash = build_manifest.content_hash(json.dumps(sorted(run.tvg_ids.items())))
+    entries = run.entries
+    if run.restored and run.manifest.setting('epg') != epg_hash:
+        logging.info('EPG data changed since the last run, matching restored entries again')
+        for entry in run.restored:
+            run.unmatched_by_entry.pop(entry, None)
+            # Entries that match nothing now keep their tvg-id from the source
+            source_tvg_id = run.source_tvg_ids.get(entry)
+            if source_tvg_id is None:
+                entry.attrs.pop('tvg-id', None)
+            else:
+                entry.set('tvg-id', source_tvg_id)
+        entries = run.entries + run.restored
+    _, unmatched_entries = stages.update_tvg_ids(entries, run.tvg_ids, run.config['similarity_threshold'],
+                                                 run.unmatched_by_entry, run.config['match_processes'])
+    if entries is run.entries:
+        restored = [run.unmatched_by_entry[entry] for entry in run.restored if entry in run.unmatched_by_entry]
+        unmatched_entries = restored + unmatched_entries
+    return {'unmatched_entries': unmatched_entries, 'epg_hash': epg_hash}
+
+
+def all_entries(run):
+    # Entries set aside by restore, back in their original order
+    if not run.restored:
+        return run.entries
+    return sorted(run.entries + run.restored, key=run.positions.__getitem__)
+
+
+def sort(run):
+    entries = all_entries(run)
+    if run.config['min_playability'] is not None:
+        entries = stages.filter_playable(entries, run.config['min_playability'])
+    return {'entries': list(stages.sort_entries(entries, run.config['sort_order'])), 'restored': []}
+
+
+def write_outputs(config, entries, unmatched_entries):
+    # The playlist, its split files and the report are written in one pass
+    with report.ReportWriter(config['report']) if config['report'] else nullcontext() as report_writer:
+        if report_writer is not None:
+            entries = report.recorded(entries, report_writer)
+        with playlist_writer.PlaylistWriter(config['output'], config['write_attributes'],
+                                            name_template=config['name_template'],
+                                            group_headers=config['group_headers'], compress=config['compress'],
+                                            split_by=config['split_by'], split_dir=config['split_dir']) as writer:
+            for entry in entries:
+                writer.add(entry)
+            stages.write_unmatched(writer, unmatched_entries)
+
+
+def write(run):
+    write_outputs(run.config, all_entries(run), run.unmatched_entries)
+    if run.manifest is not None:
+        # Entries the probe stage passed over are recorded as unprobed fallbacks
+        probed = 'probe' in run.config['stages']
+        now = time.time()
+        records = ((run.entry_keys[entry],
+                    build_manifest.entry_state(entry, run.unmatched_by_entry.get(entry),
+                                               run.unprobed_at.get(entry, now)
+                                               if probed and entry.checked_at is None else None))
+                   for entry in all_entries(run) if entry in run.entry_keys)
+        run.manifest.save(records, run.source_hashes, {'settings': run.settings_hash, 'epg': run.epg_hash or ''})
+    return {}
+
+
+# name: (stages it runs after, function). Only stages that replace the entry
+# list or read fields another stage writes need to be ordered; epg-fetch has
+# no predecessors and runs alongside everything up to epg-match.
+STAGES = {
+    'fetch': ((), fetch),
+    'clean': (('fetch',), clean),
+    'dedupe': (('clean',), dedupe_stage),
+    'check': (('dedupe',), check),
+    'restore': (('check',), restore),
+    'standardize': (('restore',), standardize),
+    'epg-fetch': ((), epg_fetch_stage),
+    'epg-match': (('standardize', 'epg-fetch'), epg_match),
+    'probe': (('standardize', 'epg-match'), probe),
+    'sort': (('probe', 'epg-match'), sort),
+    'write': (('sort',), write),
+}
+REQUIRES = {'epg-match': 'epg-fetch'}  # Stages that cannot run without another one
+
+
+def dependencies(name, selected):
+    # Nearest selected predecessors, skipping over stages that are not run
+    found = []
+    for before in STAGES[name][0]:
+        if before in selected:
+            found.append(before)
+        else:
+            found.extend(dependencies(before, selected))
+    return found
+
+
+def write_intermediate(run, name, position):
+    path = os.path.join(run.config['intermediate_dir'], f'{position:02d}-{name}.m3u')
+    m3u.write_playlist(path, run.entries)
+
+
+def run_stage(name, run):
+    with metrics.stage(name, len(run.entries)) as record:
+        result = STAGES[name][1](run)
+    if record is not None:
+        record['entries_out'] = len(result.get('entries', run.entries))
+    return result
+
+
+def run_stages(run, selected):
+    waiting = {name: set(dependencies(name, selected)) for name in selected}
+    finished = []
+    with ThreadPoolExecutor(max_workers=len(selected)) as executor:
+        running = {}
+        while waiting or running:
+            for name in [name for name, before in waiting.items() if before <= set(finished)]:
+                del waiting[name]
+                logging.info(f'Starting stage {name}')
+                running[executor.submit(run_stage, name, run)] = name
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                for key, value in future.result().items():
+                    setattr(run, key, value)
+                finished.append(name)
+                logging.info(f'Finished stage {name} ({len(run.entries)} entries)')
+                if run.config['intermediate_dir'] and name not in ('epg-fetch', 'write'):
+                    write_intermediate(run, name, selected.index(name) + 1)
+
+
+def load_config(args):
+    config = dict(DEFAULTS)
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as file:
+            config.update(json.load(file))
+    for key, value in vars(args).items():
+        if key != 'config' and value is not None:
+            config[key] = value
+    return config
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Fetch, clean, probe and EPG-match M3U playlists in one run.')
+    parser.add_argument('--config', help='JSON file with pipeline settings')
+    parser.add_argument('--source', dest='sources', action='append', help='playlist URL to download (repeatable)')
+    parser.add_argument('--input', dest='inputs', action='append', help='local playlist file (repeatable)')
+    parser.add_argument('--epg-url', dest='epg_urls', action='append', help='XMLTV guide URL (repeatable)')
+    parser.add_argument('--output', help='output playlist path')
+    parser.add_argument('--stages', type=lambda value: value.split(','),
+                        help='comma separated stages to run: ' + ','.join(STAGES))
+    parser.add_argument('--dedupe-policy', choices=dedupe.POLICIES, help='entry kept for duplicate streams')
+    parser.add_argument('--name-template', help="channel name as written, e.g. '{name} ({latency:.1f}s)'")
+    parser.add_argument('--sort-order', type=lambda value: value.split(','),
+                        help='comma separated sort keys in priority order: ' + ','.join(stages.SORT_KEYS))
+    parser.add_argument('--no-group-headers', dest='group_headers', action='store_const', const=False,
+                        help='do not write "# --- Group ---" lines')
+    parser.add_argument('--gzip', dest='compress', action='store_const', const=True,
+                        help='also write a gzip copy of every playlist')
+    parser.add_argument('--split-by', choices=playlist_writer.SPLIT_KEYS,
+                        help='also write one playlist per group or country')
+    parser.add_argument('--split-dir', help='directory of the split playlists')
+    parser.add_argument('--match-processes', type=int, help='worker processes for epg-match')
+    parser.add_argument('--throughput', dest='throughput_segments', type=int, nargs='?', const=throughput.SEGMENTS,
+                        help='download this many segments of every HLS stream to measure its playability')
+    parser.add_argument('--min-playability', type=float, help='drop entries measured below this playability (0 to 1)')
+    parser.add_argument('--report', help='write the probe results to this .csv or .json file')
+    parser.add_argument('--metrics', help='write a JSON run report with time per stage and counters to this file')
+    parser.add_argument('--prometheus', help='write the run report as a Prometheus textfile to this file')
+    parser.add_argument('--serve', nargs='?', const=f'{daemon.HOST}:{daemon.PORT}',
+                        help='keep running and serve the playlist on HOST:PORT, re-probing channels on a schedule')
+    parser.add_argument('--incremental', nargs='?', const=build_manifest.MANIFEST_PATH,
+                        help='only process entries that changed since the last run (build manifest path)')
+    parser.add_argument('--intermediate-dir', help='write the entry set after every stage into this directory')
+    parser.add_argument('--probe-cache', help='probe cache path')
+    parser.add_argument('--no-probe-cache', dest='probe_cache', action='store_const', const='', help='probe everything again')
+    parser.add_argument('--host-health', help='host health path')
+    parser.add_argument('--no-host-health', dest='host_health', action='store_const', const='',
+                        help='try every URL, even on hosts that keep failing')
+    args = parser.parse_args(argv)
+
+    config = load_config(args)
+    unknown = [name for name in config['stages'] if name not in STAGES]
+    if unknown:
+        parser.error(f'unknown stages: {", ".join(unknown)}')
+    for name, required in REQUIRES.items():
+        if name in config['stages'] and required not in config['stages']:
+            parser.error(f'stage {name} needs stage {required}')
+    if config['incremental'] and 'restore' not in config['stages']:
+        parser.error('--incremental needs stage restore')
+    unknown = [name for name in config['sort_order'] if name not in stages.SORT_KEYS]
+    if unknown:
+        parser.error(f'unknown sort keys: {", ".join(unknown)}')
+    return config
+
+
+def render_playlist(config, entries, unmatched_entries=None):
+    with playlist_writer.PlaylistWriter(None, config['write_attributes'], name_template=config['name_template'],
+                                        group_headers=config['group_headers']) as writer:
+        for entry in stages.sort_entries(entries, config['sort_order']):
+            writer.add(entry)
+        stages.write_unmatched(writer, unmatched_entries)
+    return writer.getvalue()
+
+
+def serve(run):
+    # Keeps the entries of the first run in memory, re-probes them on a
+    # schedule, rewrites the outputs after changes and serves the playlist
+    # over HTTP. A full run from the sources replaces them every
+    # refresh_interval.
+    config = run.config
+    unmatched_entries = run.unmatched_entries
+
+    def refresh():
+        nonlocal unmatched_entries
+        next_run = Run(config, run.cache, run.manifest, run.health)
+        run_stages(next_run, config['stages'])
+        unmatched_entries = next_run.unmatched_entries
+        return all_entries(next_run)
+
+    def render(entries):
+        return render_playlist(config, entries, unmatched_entries)
+
+    def publish(entries):
+        # The same outputs as the write stage: split files, gzip copies and report included
+        write_outputs(config, stages.sort_entries(entries, config['sort_order']), unmatched_entries)
+
+    host, _, port = config['serve'].rpartition(':')
+    catalog = daemon.Catalog(all_entries(run), render, publish)
+    daemon.serve(catalog, host or daemon.HOST, int(port), refresh, config['refresh_interval'], health=run.health,
+                 segments=config['throughput_segments'], healthy_mirrors=config['healthy_mirrors'])
+
+
+def main(argv=None):
+    config = parse_args(argv)
+    if config['intermediate_dir']:
+        os.makedirs(config['intermediate_dir'], exist_ok=True)
+
+    if config['metrics'] or config['prometheus']:
+        metrics.enable()
+
+    with probe_cache.ProbeCache(config['probe_cache']) if config['probe_cache'] else nullcontext() as cache, \
+            build_manifest.BuildManifest(config['incremental']) if config['incremental'] else nullcontext() as manifest, \
+            host_health.HostHealth(config['host_health']) if config['host_health'] else nullcontext() as health:
+        run = Run(config, cache, manifest, health)
+        run_stages(run, config['stages'])
+
+        if metrics.ENABLED:
+            run_report = metrics.report()
+            if config['metrics']:
+                metrics.write_json(config['metrics'], run_report)
+            if config['prometheus']:
+                metrics.write_prometheus(config['prometheus'], run_report)
+
+        if config['serve']:
+            serve(run)
+
+    logging.info("Process completed.")
+
+
+if __name__ == '__main__':
+    main()
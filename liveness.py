@@ -0,0 +1,105 @@
+import asyncio
+from collections import defaultdict
+
+import aiohttp
+from tqdm import tqdm
+
+import metrics
+from url_utils import url_host
+
+# Configuration values
+TIMEOUT = 10  # Timeout for a single HEAD request
+MAX_IN_FLIGHT = 256  # Global budget of concurrent requests
+PER_HOST_LIMIT = 8  # Concurrent requests allowed against one host
+KEEPALIVE_TIMEOUT = 30  # Seconds an idle pooled connection is kept open
+
+
+def conditional_headers(cache, url):
+    etag, last_modified = cache.validators(url)
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+async def _head(session, url, timeout, headers=None):
+    # Returns (status, etag, last_modified); status is None when the request failed
+    try:
+        async with session.head(url, allow_redirects=False, headers=headers,
+                                timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            return response.status, response.headers.get('ETag'), response.headers.get('Last-Modified')
+    except asyncio.TimeoutError:
+        if metrics.ENABLED:
+            metrics.count('liveness_timeouts', host=url_host(url))
+        return None, None, None
+    except (aiohttp.ClientError, ValueError):
+        return None, None, None
+
+
+async def _check_all(urls, timeout, max_in_flight, per_host, progress, cache, health):
+    # The connector pools keep-alive connections; the semaphores make sure the
+    # request timeout only starts once a slot is actually ours. The circuit of
+    # a host is checked once its slot is free, so URLs queued behind the
+    # failures that opened it are skipped.
+    global_limit = asyncio.Semaphore(max_in_flight)
+    host_limits = defaultdict(lambda: asyncio.Semaphore(per_host))
+    connector = aiohttp.TCPConnector(limit=max_in_flight, limit_per_host=per_host,
+                                     ttl_dns_cache=300, keepalive_timeout=KEEPALIVE_TIMEOUT)
+
+    async def check(session, url):
+        headers = None
+        if cache is not None:
+            hit, value = cache.get(url, 'liveness')
+            if hit:
+                if metrics.ENABLED:
+                    metrics.count('liveness_checks', host=url_host(url), outcome='cached')
+                if progress is not None:
+                    progress.update(1)
+                return value[0]
+            headers = conditional_headers(cache, url)
+
+        host = url_host(url)
+        async with host_limits[host]:
+            if health is not None and not health.allow(url):
+                if progress is not None:
+                    progress.update(1)
+                return False
+            async with global_limit:
+                status, etag, last_modified = await _head(session, url, timeout, headers)
+
+        if health is not None:
+            health.record(url, status)
+        if cache is not None:
+            if status == 304:
+                cache.revalidated(url)
+            elif status == 200:
+                cache.put(url, 'liveness', (True, status), etag=etag, last_modified=last_modified)
+            else:
+                cache.put(url, 'liveness', (False, status))
+        if metrics.ENABLED:
+            metrics.count('liveness_checks', host=host, outcome=str(status) if status else 'error')
+        if progress is not None:
+            progress.update(1)
+        return status in (200, 304)
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        return await asyncio.gather(*(check(session, url) for url in urls))
+
+
+def check_urls(urls, timeout=TIMEOUT, max_in_flight=MAX_IN_FLIGHT, per_host=PER_HOST_LIMIT, cache=None,
+               desc="Checking Channels", health=None):
+    unique_urls = list(dict.fromkeys(urls))
+    with tqdm(total=len(unique_urls), desc=desc) as progress:
+        results = asyncio.run(_check_all(unique_urls, timeout, max_in_flight, per_host, progress, cache, health))
+    return dict(zip(unique_urls, results))
+
+
+def check_and_filter_entries(entries, timeout=TIMEOUT, max_in_flight=MAX_IN_FLIGHT, per_host=PER_HOST_LIMIT,
+                             cache=None, health=None):
+    entries = list(entries)
+    urls = [entry.url for entry in entries]
+    working = check_urls(urls, timeout=timeout, max_in_flight=max_in_flight, per_host=per_host, cache=cache,
+                         health=health)
+    return [entry for entry, url in zip(entries, urls) if working[url]]
@@ -0,0 +1,247 @@
+import json
+import sys
+from urllib.parse import unquote
+
+import playlist_writer
+
+OPTION_PREFIXES = ('#KODIPROP', '#EXTVLCOPT', '#EXTHTTP')
+VLC_HEADER_OPTIONS = {
+    'http-user-agent': 'User-Agent',
+    'http-referrer': 'Referer',
+    'http-referer': 'Referer',
+    'http-origin': 'Origin',
+}
+
+
+PROBE_FIELDS = ('latency', 'ttfb', 'resolution', 'codec', 'bitrate', 'speed_ratio', 'availability', 'refresh_latency',
+                'playability', 'checked_at')
+
+
+class Entry:
+    # Probe results are kept as typed fields (None until probed): latency and
+    # ttfb in seconds, resolution label, codec name, bitrate in bits/s, the
+    # segment throughput results (see throughput.ThroughputResult) and
+    # checked_at as a Unix timestamp. They only reach the channel name through
+    # an explicit name template when the playlist is written.
+    # Option lines are kept where the source had them: `options` between
+    # #EXTINF and the URL, `leading` before #EXTINF and `trailing` after the
+    # URL of the last entry.
+    __slots__ = ('duration', 'attrs', 'name', 'options', 'url', 'leading', 'trailing', *PROBE_FIELDS)
+
+    def __init__(self, duration='-1', attrs=None, name='', options=None, url='', leading=(), trailing=()):
+        self.duration = duration
+        self.attrs = attrs if attrs is not None else {}
+        self.name = name
+        self.options = options if options is not None else []
+        self.url = url
+        self.leading = leading
+        self.trailing = trailing
+        self.latency = None
+        self.ttfb = None
+        self.resolution = None
+        self.codec = None
+        self.bitrate = None
+        self.speed_ratio = None
+        self.availability = None
+        self.refresh_latency = None
+        self.playability = None
+        self.checked_at = None
+
+    def __repr__(self):
+        return f'Entry({self.name!r}, {self.url!r})'
+
+    def get(self, key, default=''):
+        return self.attrs.get(key, default)
+
+    def set(self, key, value):
+        self.attrs[key] = sys.intern(value)
+
+    @property
+    def tvg_id(self):
+        return self.attrs.get('tvg-id', '')
+
+    @property
+    def group_title(self):
+        return self.attrs.get('group-title', '')
+
+    def http_headers(self):
+        # Request headers players would send for this stream, taken from the
+        # #EXTVLCOPT, #EXTHTTP and #KODIPROP stream_headers option lines
+        headers = {}
+        for option in self.option_lines():
+            if option.startswith('#EXTVLCOPT:'):
+                key, _, value = option[len('#EXTVLCOPT:'):].partition('=')
+                header = VLC_HEADER_OPTIONS.get(key.strip().lower())
+                if header and value.strip():
+                    headers[header] = value.strip()
+            elif option.startswith('#EXTHTTP:'):
+                try:
+                    headers.update({str(key): str(value) for key, value in json.loads(option[len('#EXTHTTP:'):]).items()})
+                except (ValueError, AttributeError):
+                    pass
+            elif option.startswith('#KODIPROP:') and 'stream_headers=' in option:
+                headers.update(split_url_headers('|' + option.split('stream_headers=', 1)[1])[1])
+        return headers
+
+    def option_lines(self):
+        return [*self.leading, *self.options, *self.trailing]
+
+    def http_request(self):
+        # (url, headers) to open the stream with, honouring Kodi's
+        # 'url|Header=value&...' syntax on top of the option lines
+        url, pipe_headers = split_url_headers(self.url)
+        headers = self.http_headers()
+        headers.update(pipe_headers)
+        return url, headers
+
+    def display_name(self, template=None):
+        # Renders e.g. '{name} ({latency:.1f}s)'. Entries missing a field the
+        # template uses keep their plain name.
+        if not template:
+            return self.name
+        fields = {field: getattr(self, field) for field in PROBE_FIELDS if getattr(self, field) is not None}
+        try:
+            return template.format(name=self.name, **fields)
+        except (KeyError, IndexError, ValueError):
+            return self.name
+
+    def extinf(self, keys=None, name_template=None):
+        if keys is None:
+            keys = self.attrs
+        name = self.display_name(name_template)
+        attributes = ' '.join(f'{key}="{self.attrs[key]}"' for key in keys if key in self.attrs)
+        if attributes:
+            return f'#EXTINF:{self.duration} {attributes},{name}'
+        return f'#EXTINF:{self.duration},{name}'
+
+    def lines(self, keys=None, name_template=None):
+        return [*self.leading, self.extinf(keys, name_template), *self.options, self.url, *self.trailing]
+
+
+def split_url_headers(url):
+    url, _, options = url.partition('|')
+    headers = {}
+    for pair in options.split('&'):
+        key, _, value = pair.partition('=')
+        if key and value:
+            headers[unquote(key)] = unquote(value)
+    return url, headers
+
+
+def _attribute_follows(line, pos):
+    # Some sources put a stray comma before further attributes, e.g.
+    # '#EXTINF:-1, group-title="Sports",Name'
+    length = len(line)
+    while pos < length and line[pos] in ' \t':
+        pos += 1
+    start = pos
+    while pos < length and (line[pos].isalnum() or line[pos] in '-_'):
+        pos += 1
+    if pos == start or pos >= length or line[pos] != '=':
+        return False
+    pos += 1
+    while pos < length and line[pos] in ' \t':
+        pos += 1
+    return pos < length and line[pos] == '"'
+
+
+def parse_extinf(line):
+    # Tokenize '#EXTINF:<duration> key="value" ...,<name>' in a single pass.
+    # Commas inside quoted attribute values do not end the attribute list.
+    line = line.strip()
+    length = len(line)
+    pos = line.find(':') + 1
+    start = pos
+    while pos < length and line[pos] not in ' \t,':
+        pos += 1
+    duration = line[start:pos] or '-1'
+    attrs = {}
+    while pos < length:
+        char = line[pos]
+        if char == ',':
+            if not _attribute_follows(line, pos + 1):
+                return duration, attrs, line[pos + 1:].strip()
+            pos += 1
+            continue
+        if char in ' \t':
+            pos += 1
+            continue
+        start = pos
+        while pos < length and line[pos] not in '=, \t':
+            pos += 1
+        key = line[start:pos]
+        if pos >= length or line[pos] != '=':
+            continue
+        pos += 1
+        while pos < length and line[pos] in ' \t':
+            pos += 1
+        if pos < length and line[pos] == '"':
+            end = line.find('"', pos + 1)
+            if end == -1:
+                end = length
+            value = line[pos + 1:end]
+            pos = end + 1
+        else:
+            start = pos
+            while pos < length and line[pos] not in ', \t':
+                pos += 1
+            value = line[start:pos]
+        if key not in attrs:
+            attrs[sys.intern(key)] = sys.intern(value)
+    return duration, attrs, ''
+
+
+def iter_entries(lines):
+    # Option lines before #EXTINF belong to the entry that follows them, so a
+    # finished entry is only yielded once the next #EXTINF (or the end of the
+    # playlist) shows that no more lines belong to it.
+    entry = None
+    finished = None
+    pending = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#EXTINF'):
+            if finished is not None:
+                yield finished
+                finished = None
+            duration, attrs, name = parse_extinf(line)
+            entry = Entry(duration, attrs, name, leading=pending or ())
+            pending = []
+        elif line.startswith('#'):
+            if entry is None:
+                if line.startswith(OPTION_PREFIXES):
+                    pending.append(sys.intern(line))
+            elif line.startswith(OPTION_PREFIXES) or line.startswith('#EXT'):
+                entry.options.append(sys.intern(line))
+        elif entry is None:
+            pending = []  # Options of a URL without #EXTINF
+        else:
+            entry.url = line
+            if finished is not None:
+                yield finished
+            finished = entry
+            entry = None
+    if finished is not None:
+        if pending:
+            finished.trailing = pending
+        yield finished
+
+
+def iter_playlist(file_path):
+    with open(file_path, 'r', encoding='utf-8') as file:
+        yield from iter_entries(file)
+
+
+def parse_playlist(file_path):
+    return list(iter_playlist(file_path))
+
+
+def write_playlist(file_path, entries, keys=None, header='#EXTM3U', name_template=None, group_headers=False,
+                   compress=False, split_by=None, split_dir=None):
+    # Published atomically, see playlist_writer.PlaylistWriter
+    with playlist_writer.PlaylistWriter(file_path, keys, header, name_template, group_headers,
+                                        compress, split_by, split_dir) as writer:
+        for entry in entries:
+            writer.add(entry)
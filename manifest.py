@@ -0,0 +1,129 @@
+import re
+import xml.etree.ElementTree as ET
+
+HLS = 'hls'
+HLS_MASTER = 'hls-master'
+DASH = 'dash'
+
+_ATTRIBUTE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+class Variant:
+    __slots__ = ('bandwidth', 'width', 'height', 'codecs', 'uri')
+
+    def __init__(self, bandwidth=0, width=0, height=0, codecs='', uri=''):
+        self.bandwidth = bandwidth
+        self.width = width
+        self.height = height
+        self.codecs = codecs
+        self.uri = uri
+
+    def __repr__(self):
+        return f'Variant({self.width}x{self.height}, {self.bandwidth}, {self.uri!r})'
+
+
+def parse_attributes(text):
+    return {key: value.strip('"') for key, value in _ATTRIBUTE.findall(text)}
+
+
+def _int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _resolution(value):
+    width, _, height = (value or '').lower().partition('x')
+    return _int(width), _int(height)
+
+
+def sniff(head):
+    # Manifest type from the first bytes of a response body, or None
+    text = head.lstrip(b'\xef\xbb\xbf \t\r\n')
+    if text.startswith(b'#EXTM3U'):
+        return HLS
+    if text.startswith(b'<') and b'<MPD' in head:
+        return DASH
+    return None
+
+
+def parse_hls(text):
+    # Returns (kind, variants). A media playlist has no variants.
+    variants = []
+    pending = None
+    is_master = False
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('#EXT-X-STREAM-INF:'):
+            is_master = True
+            attributes = parse_attributes(line[len('#EXT-X-STREAM-INF:'):])
+            width, height = _resolution(attributes.get('RESOLUTION'))
+            pending = Variant(_int(attributes.get('BANDWIDTH')), width, height, attributes.get('CODECS', ''))
+        elif pending is not None and line and not line.startswith('#'):
+            pending.uri = line
+            variants.append(pending)
+            pending = None
+    return (HLS_MASTER if is_master else HLS), variants
+
+
+class MediaPlaylist:
+    __slots__ = ('target_duration', 'segments', 'ended')
+
+    def __init__(self, target_duration=0.0, segments=(), ended=False):
+        self.target_duration = target_duration
+        self.segments = segments  # [(duration, uri)] in playlist order
+        self.ended = ended  # EXT-X-ENDLIST: a VOD playlist that is not reloaded
+
+    def __repr__(self):
+        return f'MediaPlaylist({len(self.segments)} segments, {self.target_duration}s, ended={self.ended})'
+
+
+def parse_media_playlist(text):
+    target_duration = 0.0
+    segments = []
+    duration = None
+    ended = False
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('#EXT-X-TARGETDURATION:'):
+            target_duration = float(_int(line[len('#EXT-X-TARGETDURATION:'):]))
+        elif line.startswith('#EXTINF:'):
+            try:
+                duration = float(line[len('#EXTINF:'):].split(',', 1)[0])
+            except ValueError:
+                duration = 0.0
+        elif line.startswith('#EXT-X-ENDLIST'):
+            ended = True
+        elif duration is not None and line and not line.startswith('#'):
+            segments.append((duration, line))
+            duration = None
+    return MediaPlaylist(target_duration, segments, ended)
+
+
+def parse_dash(text):
+    variants = []
+    root = ET.fromstring(text)
+    for adaptation_set in root.iter():
+        if not adaptation_set.tag.endswith('AdaptationSet'):
+            continue
+        for representation in adaptation_set:
+            if not representation.tag.endswith('Representation'):
+                continue
+            mime_type = representation.get('mimeType') or adaptation_set.get('mimeType') or ''
+            width = _int(representation.get('width') or adaptation_set.get('width'))
+            height = _int(representation.get('height') or adaptation_set.get('height'))
+            if width and height or mime_type.startswith('video'):
+                variants.append(Variant(
+                    _int(representation.get('bandwidth')), width, height,
+                    representation.get('codecs') or adaptation_set.get('codecs') or '',
+                    representation.get('id') or '',
+                ))
+    return DASH, variants
+
+
+def best_variant(variants):
+    sized = [variant for variant in variants if variant.width and variant.height]
+    if not sized:
+        return None
+    return max(sized, key=lambda variant: (variant.width * variant.height, variant.bandwidth))
@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Configuration values
+PROMETHEUS_PREFIX = 'iptv_'  # Prefix of every metric name in the Prometheus textfile
+
+# Collection is off until enable() is called. Hot paths check ENABLED before
+# building labels, so a disabled run only pays for one global lookup.
+ENABLED = False
+
+_lock = threading.Lock()
+_started_at = None
+_stages = {}
+_counters = {}
+_summaries = {}
+_disabled_stage = nullcontext()
+
+
+def enable():
+    global ENABLED, _started_at
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _summaries.clear()
+        _started_at = time.time()
+    ENABLED = True
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def count(name, value=1, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    # Count, sum and maximum of a duration or size, e.g. probe time per host
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        summary = _summaries.get(key)
+        if summary is None:
+            _summaries[key] = [1, value, value]
+        else:
+            summary[0] += 1
+            summary[1] += value
+            summary[2] = max(summary[2], value)
+
+
+@contextmanager
+def _timed_stage(name, entries_in):
+    # CPU time is that of the whole process while the stage ran, including its
+    # worker threads and any stage running alongside it
+    record = {'entries_in': entries_in, 'entries_out': None}
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield record
+    finally:
+        record['wall_seconds'] = time.perf_counter() - wall_start
+        record['cpu_seconds'] = time.process_time() - cpu_start
+        with _lock:
+            _stages[name] = record
+
+
+def stage(name, entries_in=None):
+    # `with metrics.stage(name, n) as record:` yields a dict the caller may
+    # fill in (entries_out), or None when collection is disabled
+    return _timed_stage(name, entries_in) if ENABLED else _disabled_stage
+
+
+def report():
+    with _lock:
+        return {
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(_started_at)) if _started_at else None,
+            'wall_seconds': time.time() - _started_at if _started_at else None,
+            'stages': {name: dict(record) for name, record in _stages.items()},
+            'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                         for (name, labels), value in sorted(_counters.items())],
+            'summaries': [{'name': name, 'labels': dict(labels), 'count': summary[0], 'sum': summary[1],
+                           'max': summary[2]}
+                          for (name, labels), summary in sorted(_summaries.items())],
+        }
+
+
+def _replace(path, text):
+    with open(path + '.part', 'w', encoding='utf-8') as file:
+        file.write(text)
+    os.replace(path + '.part', path)
+
+
+def write_json(path, run_report=None):
+    _replace(path, json.dumps(run_report or report(), indent=2, ensure_ascii=False) + '\n')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _sample(name, labels, value):
+    label_text = ','.join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+    return f'{PROMETHEUS_PREFIX}{name}{{{label_text}}} {value}' if label_text else f'{PROMETHEUS_PREFIX}{name} {value}'
+
+
+def prometheus_text(run_report=None):
+    # Text exposition format for the node_exporter textfile collector
+    run_report = run_report or report()
+    families = {}
+
+    def add(name, kind, labels, value):
+        families.setdefault((name, kind), []).append(_sample(name, labels, value))
+
+    if run_report['wall_seconds'] is not None:
+        add('run_wall_seconds', 'gauge', {}, run_report['wall_seconds'])
+    for name, record in run_report['stages'].items():
+        for field in ('wall_seconds', 'cpu_seconds', 'entries_in', 'entries_out'):
+            if record.get(field) is not None:
+                add(f'stage_{field}', 'gauge', {'stage': name}, record[field])
+    for counter in run_report['counters']:
+        add(counter['name'] + '_total', 'counter', counter['labels'], counter['value'])
+    for summary in run_report['summaries']:
+        add(summary['name'] + '_count', 'gauge', summary['labels'], summary['count'])
+        add(summary['name'] + '_sum', 'gauge', summary['labels'], summary['sum'])
+        add(summary['name'] + '_max', 'gauge', summary['labels'], summary['max'])
+
+    lines = []
+    for (name, kind), samples in families.items():
+        lines.append(f'# TYPE {PROMETHEUS_PREFIX}{name} {kind}')
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path, run_report=None):
+    # Renamed into place so the collector never scrapes a half written file
+    _replace(path, prometheus_text(run_report))
@@ -0,0 +1,64 @@
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Configuration values
+POOL_SIZE = 32  # Keep-alive connections kept per host
+RETRIES = 3  # Extra attempts after a connection error, timeout or retryable status
+BACKOFF = 0.5  # Base delay in seconds, doubled on every attempt
+MAX_BACKOFF = 10  # Upper bound for a single delay
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RetryableStatus(requests.HTTPError):
+    def __init__(self, response):
+        super().__init__(f'{response.status_code} {response.reason} for url: {response.url}', response=response)
+        retry_after = response.headers.get('Retry-After', '')
+        self.retry_after = min(float(retry_after), MAX_BACKOFF) if retry_after.isdigit() else None
+
+
+TRANSIENT_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    RetryableStatus,
+)
+
+
+def make_session(pool_size=POOL_SIZE):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def backoff_delay(attempt, backoff=BACKOFF):
+    # Exponential backoff with full jitter, so parallel retries do not line up
+    return random.uniform(0, min(MAX_BACKOFF, backoff * 2 ** attempt))
+
+
+def retry(call, retries=RETRIES, backoff=BACKOFF):
+    for attempt in range(retries + 1):
+        try:
+            return call()
+        except TRANSIENT_ERRORS as e:
+            if attempt >= retries:
+                raise
+            time.sleep(getattr(e, 'retry_after', None) or backoff_delay(attempt, backoff))
+
+
+def _get(session, url, **kwargs):
+    response = session.get(url, **kwargs)
+    if response.status_code in RETRY_STATUSES:
+        response.close()
+        raise RetryableStatus(response)
+    return response
+
+
+def get(session, url, retries=RETRIES, backoff=BACKOFF, **kwargs):
+    # session.get with bounded, jittered retries on connection errors, timeouts
+    # and 429/5xx answers. Other statuses are returned to the caller as-is.
+    return retry(lambda: _get(session, url, **kwargs), retries=retries, backoff=backoff)
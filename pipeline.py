@@ -0,0 +1,102 @@
+import heapq
+import os
+import pickle
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+# Configuration values
+SORT_BUFFER_SIZE = 100000  # Entries sorted in memory before a run is spilled to disk
+WINDOW = 256  # Maximum number of tasks queued ahead of the consumer in bounded_map
+CHUNK_SIZE = 2000  # Items sent to a worker process per task by process_map
+
+
+def apply(entries, func):
+    for entry in entries:
+        func(entry)
+        yield entry
+
+
+def unique(entries, key=lambda entry: entry.url):
+    seen = set()
+    for entry in entries:
+        entry_key = key(entry)
+        if entry_key not in seen:
+            seen.add(entry_key)
+            yield entry
+
+
+def bounded_map(executor, func, items, window=WINDOW):
+    # Like executor.map, but only keeps `window` futures in flight so the input
+    # is consumed lazily instead of being submitted all at once.
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def chunked(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def process_map(func, items, workers=None, initializer=None, initargs=(), chunk_size=CHUNK_SIZE):
+    # Runs func(chunk) -> list of results over chunks of items in a process
+    # pool and yields the results one by one in input order. Read-only lookup
+    # tables go to initializer(*initargs), which runs once per worker process,
+    # instead of being pickled with every chunk; func and initializer must be
+    # module-level functions.
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        for results in bounded_map(executor, func, chunked(items, chunk_size), window=2 * workers):
+            yield from results
+
+
+def _write_run(buffer):
+    buffer.sort()
+    run = tempfile.TemporaryFile()
+    for item in buffer:
+        pickle.dump(item, run, protocol=pickle.HIGHEST_PROTOCOL)
+    run.seek(0)
+    return run
+
+
+def _read_run(run):
+    with run:
+        while True:
+            try:
+                yield pickle.load(run)
+            except EOFError:
+                return
+
+
+def sorted_entries(entries, key, buffer_size=SORT_BUFFER_SIZE):
+    # Stable sort that falls back to an external merge sort once more than
+    # buffer_size entries have been seen. The sequence number keeps the order
+    # stable and ensures entries themselves are never compared.
+    runs = []
+    buffer = []
+    for seq, entry in enumerate(entries):
+        buffer.append((key(entry), seq, entry))
+        if len(buffer) >= buffer_size:
+            runs.append(_write_run(buffer))
+            buffer = []
+
+    if not runs:
+        buffer.sort()
+        for _, _, entry in buffer:
+            yield entry
+        return
+
+    if buffer:
+        runs.append(_write_run(buffer))
+    for _, _, entry in heapq.merge(*(_read_run(run) for run in runs)):
+        yield entry
@@ -0,0 +1,52 @@
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import metrics
+import net
+
+# Configuration values
+TIMEOUT = (10, 60)  # Connect and read timeout for one playlist source
+MAX_WORKERS = 8  # Sources downloaded at the same time
+SPOOL_SIZE = 8 * 1024 * 1024  # Bytes of a downloaded playlist kept in memory before spilling to disk
+
+
+def _download_once(session, url, clean, timeout):
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE, mode='w+', encoding='utf-8', newline='\n')
+    try:
+        response = net.get(session, url, retries=0, timeout=timeout, stream=True)
+        with response:
+            response.raise_for_status()
+            if response.encoding is None:
+                response.encoding = 'utf-8'
+            lines = response.iter_lines(decode_unicode=True)
+            for line in clean(lines) if clean else lines:
+                spool.write(line + '\n')
+            metrics.count('source_bytes', response.raw.tell(), source=url)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def download(session, url, clean=None, timeout=TIMEOUT, retries=net.RETRIES):
+    # The body is decoded line by line as it arrives and spooled to a temporary
+    # file; a connection drop halfway through retries the whole source.
+    return net.retry(lambda: _download_once(session, url, clean, timeout), retries=retries)
+
+
+def fetch_all(urls, clean=None, session=None, max_workers=MAX_WORKERS, timeout=TIMEOUT):
+    # Yields (url, spool, error) in the configured order while later sources
+    # keep downloading in the background. Exactly one of spool/error is set.
+    session = session or net.make_session(max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(download, session, url, clean, timeout) for url in urls]
+        for url, future in zip(urls, futures):
+            try:
+                spool = future.result()
+            except requests.RequestException as e:
+                yield url, None, e
+                continue
+            yield url, spool, None
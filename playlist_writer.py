@@ -0,0 +1,167 @@
+import gzip
+import os
+import re
+
+# Configuration values
+BUFFER_SIZE = 1024 * 1024  # Characters collected per output before they are written in one call
+UNDEFINED = 'Undefined'  # Split file for entries without a group or country
+
+UNSAFE_FILENAME = re.compile(r'[^\w\-. ]+')
+
+
+def render(entry, keys=None, name_template=None):
+    return '\n'.join(entry.lines(keys, name_template)) + '\n\n'
+
+
+def section_header(group, first=False):
+    # The blank line after the #EXTM3U header comes before the first section
+    return ('\n' if first else '') + f'# --- {group} ---\n'
+
+
+def country(entry):
+    # tvg-ids end in the country code, e.g. BBSTV.kr or BBSTV.kr@SD
+    _, dot, code = entry.tvg_id.strip().split('@')[0].rpartition('.')
+    return code.upper() if dot and code.isalpha() else ''
+
+
+# Split keys by name; entries with an empty key go to UNDEFINED
+SPLIT_KEYS = {
+    'group': lambda entry: entry.group_title.strip(),
+    'country': country,
+}
+
+
+class AtomicOutput:
+    # Text written to `path`.part (and `path`.gz.part when compressed) in large
+    # chunks and renamed over `path` by commit(), so players never load a
+    # truncated playlist. The part file is only open while a chunk is written,
+    # which keeps one handle per flush instead of one per split file; gzip
+    # output gets one gzip member per chunk, which gzip readers read as one
+    # stream.
+    def __init__(self, path, compress=False, buffer_size=BUFFER_SIZE):
+        self.paths = [path, path + '.gz'] if compress else [path]
+        self.buffer_size = buffer_size
+        self.group = None
+        self.sections = 0
+        self._chunks = []
+        self._size = 0
+        self._mode = 'wt'
+
+    def write(self, text):
+        self._chunks.append(text)
+        self._size += len(text)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        text = ''.join(self._chunks)
+        for path in self.paths:
+            opener = gzip.open if path.endswith('.gz') else open
+            with opener(path + '.part', self._mode, encoding='utf-8') as file:
+                file.write(text)
+        self._chunks = []
+        self._size = 0
+        self._mode = 'at'
+
+    def commit(self):
+        self.flush()
+        for path in self.paths:
+            os.replace(path + '.part', path)
+
+    def discard(self):
+        for path in self.paths:
+            try:
+                os.remove(path + '.part')
+            except OSError:
+                pass
+
+
+class BufferOutput:
+    # In-memory stand-in for AtomicOutput, for a playlist that is served
+    # instead of written
+    def __init__(self):
+        self.group = None
+        self.sections = 0
+        self._chunks = []
+
+    def write(self, text):
+        self._chunks.append(text)
+
+    def commit(self):
+        pass
+
+    def discard(self):
+        self._chunks = []
+
+    def getvalue(self):
+        return ''.join(self._chunks)
+
+
+class PlaylistWriter:
+    # Writes one playlist and, with split_by ('group' or 'country'), one
+    # playlist per group or country in split_dir, all in a single pass over
+    # the entries. Every file is published when the with block ends and
+    # discarded when it raises. With path None the playlist is only rendered
+    # in memory, see getvalue().
+    def __init__(self, path, keys=None, header='#EXTM3U', name_template=None, group_headers=False,
+                 compress=False, split_by=None, split_dir=None):
+        if split_by is not None and split_by not in SPLIT_KEYS:
+            raise ValueError(f"Unknown split key {split_by!r}; expected {', '.join(SPLIT_KEYS)}")
+        self.keys = keys
+        self.header = header
+        self.name_template = name_template
+        self.group_headers = group_headers
+        self.compress = compress
+        self.split_key = SPLIT_KEYS[split_by] if split_by else None
+        if self.split_key is not None:
+            self.split_dir = split_dir or os.path.dirname(os.path.abspath(path))
+            os.makedirs(self.split_dir, exist_ok=True)
+        self._main = self._open(path)
+        self._splits = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        outputs = [*self._splits.values(), self._main]
+        if exc_type is None:
+            for output in outputs:
+                output.commit()
+        else:
+            for output in outputs:
+                output.discard()
+
+    def _open(self, path):
+        output = AtomicOutput(path, self.compress) if path is not None else BufferOutput()
+        output.write(self.header + '\n')
+        return output
+
+    def _split(self, entry):
+        name = UNSAFE_FILENAME.sub('_', self.split_key(entry)).strip(' .') or UNDEFINED
+        # Names differing only in case share a file, as they would on Windows
+        output = self._splits.get(name.casefold())
+        if output is None:
+            output = self._splits[name.casefold()] = self._open(os.path.join(self.split_dir, name + '.m3u'))
+        return output
+
+    def _add(self, output, entry, text):
+        if self.group_headers and entry.group_title != output.group:
+            if entry.group_title:
+                output.write(section_header(entry.group_title, output.sections == 0))
+                output.sections += 1
+            output.group = entry.group_title
+        output.write(text)
+
+    def add(self, entry):
+        text = render(entry, self.keys, self.name_template)
+        self._add(self._main, entry, text)
+        if self.split_key is not None:
+            self._add(self._split(entry), entry, text)
+
+    def write(self, text):
+        # Raw text for the main playlist only, e.g. trailing comments
+        self._main.write(text)
+
+    def getvalue(self):
+        # Text of a playlist rendered with path None
+        return self._main.getvalue()
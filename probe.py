@@ -0,0 +1,301 @@
+import json
+import os
+import subprocess
+import time
+import xml.etree.ElementTree as ET
+from contextlib import nullcontext
+
+import requests
+
+import manifest
+import metrics
+import throughput
+from adaptive import AdaptiveLimit
+from url_utils import url_host
+
+# Configuration values
+FFPROBE_TIMEOUT = 20  # Hard limit for one ffprobe run (response time check)
+FFMPEG_TIMEOUT = 20  # Hard limit for one ffprobe run when only the resolution is needed
+PROBE_SIZE = 1000000  # Bytes ffprobe may read before it has to report the streams
+ANALYZE_DURATION = 2000000  # Microseconds of media ffprobe may analyze
+IO_TIMEOUT = 10  # Seconds ffprobe waits on a stalled connection
+MANIFEST_TIMEOUT = (5, 15)  # Connect and read timeout for the manifest pre-check
+MAX_MANIFEST_BYTES = 2 * 1024 * 1024  # Manifests larger than this are not read further
+CHUNK_SIZE = 64 * 1024
+NETWORK_CONCURRENCY = (16, 256)  # Initial and maximum parallel manifest requests
+CPU_CONCURRENCY = (os.cpu_count() or 1, 4 * (os.cpu_count() or 1))  # Initial and maximum ffprobe processes
+
+
+def resolution_label(width, height):
+    if width >= 1920 or height >= 1080:
+        return "FHD"
+    elif width >= 1280 or height >= 720:
+        return "HD"
+    else:
+        return "SD"
+
+
+class StreamInfo:
+    __slots__ = ('width', 'height', 'codec', 'stream_info_time')
+
+    def __init__(self, width, height, codec, stream_info_time):
+        self.width = width
+        self.height = height
+        self.codec = codec
+        self.stream_info_time = stream_info_time
+
+    def __repr__(self):
+        return f'StreamInfo({self.width}x{self.height}, {self.codec!r}, {self.stream_info_time:.2f}s)'
+
+
+def ffprobe_command(url, headers=None):
+    command = [
+        'ffprobe', '-v', 'error',
+        '-probesize', str(PROBE_SIZE), '-analyzeduration', str(ANALYZE_DURATION),
+        '-rw_timeout', str(IO_TIMEOUT * 1000000),
+        '-select_streams', 'v:0', '-show_entries', 'stream=codec_name,width,height', '-of', 'json',
+    ]
+    if headers:
+        command += ['-headers', ''.join(f'{key}: {value}\r\n' for key, value in headers.items())]
+    return command + [url]
+
+
+def ffprobe_stream_info(url, headers=None, timeout=FFPROBE_TIMEOUT):
+    # Runs ffprobe on the first video stream only, with bounded probe size and
+    # analyze duration, so it stops reading the input early. ffprobe writes
+    # its JSON when it exits, and the time until then is the stream info
+    # time; `timeout` kills it in any case. Returns None when no video stream
+    # was found.
+    start_time = time.monotonic()
+    try:
+        result = subprocess.run(ffprobe_command(url, headers), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                timeout=timeout)
+    except subprocess.TimeoutExpired:
+        if metrics.ENABLED:
+            metrics.count('ffprobe_timeouts', host=url_host(url))
+        return None
+    except OSError:
+        return None
+    try:
+        stream = json.loads(result.stdout)['streams'][0]
+        return StreamInfo(int(stream['width']), int(stream['height']), stream['codec_name'],
+                          time.monotonic() - start_time)
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+
+
+def get_video_resolution(url, timeout=FFMPEG_TIMEOUT, headers=None):
+    info = ffprobe_stream_info(url, headers, timeout)
+    return resolution_label(info.width, info.height) if info else None
+
+
+class ManifestResult:
+    __slots__ = ('alive', 'status', 'kind', 'variants', 'resolution', 'ttfb')
+
+    def __init__(self, alive, status=None, kind=None, variants=(), resolution=None, ttfb=None):
+        self.alive = alive
+        self.status = status
+        self.kind = kind
+        self.variants = variants
+        self.resolution = resolution
+        self.ttfb = ttfb
+
+
+class ProbeLimits:
+    # Separate adaptive budgets for the network-bound manifest tier and the
+    # CPU-bound ffmpeg/ffprobe tier, shared by every thread of one probe run
+    def __init__(self, network_concurrency=NETWORK_CONCURRENCY, cpu_concurrency=CPU_CONCURRENCY):
+        self.network = AdaptiveLimit(network_concurrency[0], maximum=network_concurrency[1],
+                                     timeout=sum(MANIFEST_TIMEOUT))
+        self.cpu = AdaptiveLimit(cpu_concurrency[0], maximum=cpu_concurrency[1],
+                                 timeout=max(FFPROBE_TIMEOUT, FFMPEG_TIMEOUT), cpu_bound=True)
+
+    def __repr__(self):
+        return f'ProbeLimits(network={self.network.limit}, cpu={self.cpu.limit})'
+
+
+def _slot(limit):
+    return limit.slot() if limit is not None else nullcontext()
+
+
+def fetch_manifest(session, url, headers=None, timeout=MANIFEST_TIMEOUT):
+    # Tier 1: one pooled GET. Dead streams fail here; HLS master playlists and
+    # DASH manifests usually carry the resolution of every variant. Bodies that
+    # are not manifests (raw TS/MP4 streams) are abandoned after the first chunk.
+    # ttfb is the time from sending the request to the first body bytes.
+    start_time = time.monotonic()
+    ttfb = None
+    try:
+        with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code >= 400:
+                return ManifestResult(False, response.status_code)
+            body = bytearray()
+            kind = None
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if ttfb is None:
+                    ttfb = time.monotonic() - start_time
+                body += chunk
+                if kind is None:
+                    kind = manifest.sniff(bytes(body[:1024]))
+                    if kind is None:
+                        break
+                if len(body) >= MAX_MANIFEST_BYTES:
+                    break
+            if kind is None:
+                return ManifestResult(bool(body), response.status_code, ttfb=ttfb)
+    except requests.Timeout:
+        if metrics.ENABLED:
+            metrics.count('manifest_timeouts', host=url_host(url))
+        return ManifestResult(False)
+    except requests.RequestException:
+        return ManifestResult(False)
+
+    text = body.decode('utf-8', 'replace')
+    try:
+        kind, variants = manifest.parse_hls(text) if kind == manifest.HLS else manifest.parse_dash(text)
+    except ET.ParseError:
+        variants = []
+    best = manifest.best_variant(variants)
+    resolution = resolution_label(best.width, best.height) if best else None
+    return ManifestResult(True, response.status_code, kind, variants, resolution, ttfb)
+
+
+def _manifest_tier(session, url, headers, cache, limits, health=None):
+    with _slot(limits and limits.network):
+        result = fetch_manifest(session, url, headers)
+    if health is not None:
+        health.record(url, result.status)
+    if cache is not None:
+        cache.put(url, 'liveness', (result.alive, result.status))
+        if result.ttfb is not None:
+            cache.put(url, 'ttfb', result.ttfb)
+        if result.resolution:
+            cache.put(url, 'resolution', result.resolution)
+    return result
+
+
+def probe_resolution(session, url, headers=None, cache=None, limits=None, health=None):
+    # ffmpeg (tier 2) only runs for live streams whose manifest has no resolution.
+    # URLs on a host with an open circuit get None, which is not cached.
+    def probe(url):
+        result = _manifest_tier(session, url, headers, cache, limits, health)
+        if not result.alive:
+            return None
+        if result.resolution:
+            return result.resolution
+        with _slot(limits and limits.cpu):
+            return get_video_resolution(url, headers=headers)
+    if cache is not None:
+        hit, resolution = cache.get(url, 'resolution')
+        if hit:
+            return resolution
+    if health is not None and not health.allow(url):
+        return None
+    resolution = probe(url)
+    if cache is not None:
+        cache.put(url, 'resolution', resolution)
+    return resolution
+
+
+THROUGHPUT_FIELDS = ('speed_ratio', 'availability', 'refresh_latency', 'playability')
+
+
+class StreamProbe:
+    __slots__ = ('alive', 'latency', 'ttfb', 'resolution', 'codec', 'bitrate', *THROUGHPUT_FIELDS, 'checked_at')
+
+    def __init__(self, alive, latency=None, ttfb=None, resolution=None, codec=None, bitrate=None, checked_at=None):
+        self.alive = alive
+        self.latency = latency
+        self.ttfb = ttfb
+        self.resolution = resolution
+        self.codec = codec
+        self.bitrate = bitrate
+        for field in THROUGHPUT_FIELDS:
+            setattr(self, field, None)
+        self.checked_at = checked_at
+
+    def apply(self, entry):
+        for field in self.__slots__:
+            if field != 'alive':
+                setattr(entry, field, getattr(self, field))
+
+
+def _cached_stream(cache, url):
+    hit, latency = cache.get(url, 'response_time')
+    if not hit:
+        return None
+    alive_hit, liveness = cache.get(url, 'liveness')
+    values = {kind: cache.get(url, kind)[1] for kind in ('ttfb', 'resolution', 'codec', 'bitrate')}
+    result = StreamProbe(liveness[0] if alive_hit else latency is not None, latency,
+                         checked_at=cache.checked_at(url, 'response_time'), **values)
+    throughput_hit, measured = cache.get(url, 'throughput')
+    if throughput_hit:
+        for field, value in zip(THROUGHPUT_FIELDS, measured):
+            setattr(result, field, value)
+    return result
+
+
+def _measure_throughput(session, url, headers, segments, result, cache):
+    # Fills the throughput fields of `result`; streams that are not HLS keep
+    # None. Not run inside a probe limit slot: the download takes seconds by
+    # design and would read as congestion to the adaptive limit.
+    measured = throughput.measure(session, url, headers, segments)
+    if measured is not None:
+        for field in THROUGHPUT_FIELDS:
+            setattr(result, field, getattr(measured, field))
+        if result.bitrate is None:
+            result.bitrate = measured.bitrate
+    if cache is not None:
+        cache.put(url, 'throughput', tuple(getattr(result, field) for field in THROUGHPUT_FIELDS))
+
+
+def probe_stream(session, url, headers=None, cache=None, limits=None, health=None, segments=0):
+    # Latency (time to stream info), TTFB, resolution, codec and bitrate of one
+    # stream. Served from the cache while its response time is fresh;
+    # otherwise the manifest tier runs, and ffprobe only for streams that
+    # answered it. latency stays None when ffprobe found no video stream.
+    # With `health`, URLs on a host with an open circuit are reported dead
+    # without a request, and nothing is cached for them. With `segments`, HLS
+    # streams also get a segment throughput probe (see throughput.measure),
+    # cached for a shorter time than the rest.
+    if cache is not None:
+        result = _cached_stream(cache, url)
+        if result is not None:
+            if segments and result.alive and not cache.get(url, 'throughput')[0]:
+                _measure_throughput(session, url, headers, segments, result, cache)
+            if metrics.ENABLED:
+                metrics.count('probes', host=url_host(url), outcome='cached')
+            return result
+    if health is not None and not health.allow(url):
+        return StreamProbe(False, checked_at=time.time())
+
+    start_time = time.monotonic()
+    manifest_result = _manifest_tier(session, url, headers, cache, limits, health)
+    result = StreamProbe(manifest_result.alive, ttfb=manifest_result.ttfb, checked_at=time.time())
+    if manifest_result.alive:
+        with _slot(limits and limits.cpu):
+            info = ffprobe_stream_info(url, headers)
+        best = manifest.best_variant(manifest_result.variants)
+        if info is not None:
+            result.latency = info.stream_info_time
+            result.codec = info.codec
+        elif best is not None and best.codecs:
+            result.codec = best.codecs
+        result.resolution = manifest_result.resolution or (resolution_label(info.width, info.height) if info else None)
+        result.bitrate = best.bandwidth or None if best else None
+        if segments and manifest_result.kind in (manifest.HLS, manifest.HLS_MASTER):
+            _measure_throughput(session, url, headers, segments, result, cache)
+        elif segments and cache is not None:
+            # Nothing to measure; recorded so cached runs do not try again
+            cache.put(url, 'throughput', (None,) * len(THROUGHPUT_FIELDS))
+
+    if cache is not None:
+        cache.put(url, 'response_time', result.latency)
+        for kind in ('resolution', 'codec', 'bitrate'):
+            if getattr(result, kind) is not None:
+                cache.put(url, kind, getattr(result, kind))
+    if metrics.ENABLED:
+        outcome = 'dead' if not result.alive else 'no_video' if result.latency is None else 'alive'
+        metrics.count('probes', host=url_host(url), outcome=outcome)
+        metrics.observe('probe_seconds', time.monotonic() - start_time, host=url_host(url))
+    return result
@@ -0,0 +1,182 @@
+import sqlite3
+import threading
+import time
+
+from url_utils import normalize_url
+
+# Configuration values
+CACHE_PATH = 'probe_cache.sqlite3'
+TTL = {  # Seconds a result stays fresh, per result type
+    'liveness': 6 * 3600,
+    'response_time': 24 * 3600,
+    'ttfb': 24 * 3600,
+    'resolution': 7 * 24 * 3600,
+    'codec': 7 * 24 * 3600,
+    'bitrate': 7 * 24 * 3600,
+    'throughput': 6 * 3600,
+}
+FAILURE_TTL = 3600  # Failed probes (dead stream, no response time) are retried sooner
+MAX_ENTRIES = 200000  # Least recently used URLs beyond this are evicted on close
+COMMIT_EVERY = 500  # Writes between commits, so an interrupted run keeps most results
+
+# Result type -> columns holding its value
+COLUMNS = {
+    'liveness': ('alive', 'status'),
+    'response_time': ('response_time',),
+    'ttfb': ('ttfb',),
+    'resolution': ('resolution',),
+    'codec': ('codec',),
+    'bitrate': ('bitrate',),
+    'throughput': ('speed_ratio', 'availability', 'refresh_latency', 'playability'),
+}
+TEXT_COLUMNS = {'resolution', 'codec'}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS probes (
+    url TEXT PRIMARY KEY,
+    alive INTEGER,
+    status INTEGER,
+    liveness_at REAL,
+    response_time REAL,
+    response_time_at REAL,
+    ttfb REAL,
+    ttfb_at REAL,
+    resolution TEXT,
+    resolution_at REAL,
+    codec TEXT,
+    codec_at REAL,
+    bitrate INTEGER,
+    bitrate_at REAL,
+    speed_ratio REAL,
+    availability REAL,
+    refresh_latency REAL,
+    playability REAL,
+    throughput_at REAL,
+    etag TEXT,
+    last_modified TEXT,
+    accessed_at REAL NOT NULL
+)
+'''
+
+
+class ProbeCache:
+    def __init__(self, path=CACHE_PATH, ttl=None, failure_ttl=FAILURE_TTL, max_entries=MAX_ENTRIES):
+        self.ttl = dict(TTL, **(ttl or {}))
+        self.failure_ttl = failure_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        # Caches written by an older version lack the columns of newer result types
+        existing = {row[1] for row in self._connection.execute('PRAGMA table_info(probes)')}
+        for kind, columns in COLUMNS.items():
+            for column in (*columns, f'{kind}_at'):
+                if column not in existing:
+                    column_type = 'TEXT' if column in TEXT_COLUMNS else 'REAL'
+                    self._connection.execute(f'ALTER TABLE probes ADD COLUMN {column} {column_type}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _row(self, key, columns):
+        return self._connection.execute(
+            f'SELECT {", ".join(columns)} FROM probes WHERE url = ?', (key,)
+        ).fetchone()
+
+    def get(self, url, kind):
+        # Returns (True, value) for a fresh result, (False, None) otherwise.
+        # 'liveness' values are (alive, status) tuples and 'throughput' values
+        # (speed_ratio, availability, refresh_latency, playability) tuples.
+        key = normalize_url(url)
+        columns = COLUMNS[kind]
+        with self._lock:
+            row = self._row(key, (*columns, f'{kind}_at'))
+            if row is None or row[-1] is None:
+                return False, None
+            value = row[:-1] if len(columns) > 1 else row[0]
+            if kind == 'liveness':
+                failed = not value[0]
+            elif kind == 'throughput':
+                failed = value[1] == 0  # No segment or playlist request answered
+            else:
+                failed = value is None
+            ttl = self.failure_ttl if failed else self.ttl[kind]
+            if time.time() - row[-1] > ttl:
+                return False, None
+            self._connection.execute('UPDATE probes SET accessed_at = ? WHERE url = ?', (time.time(), key))
+        if kind == 'liveness':
+            return True, (bool(value[0]), value[1])
+        return True, value
+
+    def put(self, url, kind, value, etag=None, last_modified=None):
+        key = normalize_url(url)
+        values = value if len(COLUMNS[kind]) > 1 else (value,)
+        now = time.time()
+        assignments = {column: item for column, item in zip(COLUMNS[kind], values)}
+        assignments[f'{kind}_at'] = now
+        assignments['accessed_at'] = now
+        if etag is not None or last_modified is not None:
+            assignments['etag'] = etag
+            assignments['last_modified'] = last_modified
+        columns = ', '.join(assignments)
+        updates = ', '.join(f'{column} = excluded.{column}' for column in assignments)
+        with self._lock:
+            self._connection.execute(
+                f'INSERT INTO probes (url, {columns}) VALUES (?{", ?" * len(assignments)}) '
+                f'ON CONFLICT(url) DO UPDATE SET {updates}',
+                (key, *assignments.values()),
+            )
+            self._written()
+
+    def _written(self):
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self._connection.commit()
+            self._pending = 0
+
+    def checked_at(self, url, kind):
+        # Unix time the stored result of this kind was measured, or None
+        with self._lock:
+            row = self._row(normalize_url(url), (f'{kind}_at',))
+        return row[0] if row else None
+
+    def validators(self, url):
+        # (etag, last_modified) from the last successful response, for conditional requests
+        with self._lock:
+            row = self._row(normalize_url(url), ('etag', 'last_modified'))
+        return row if row else (None, None)
+
+    def revalidated(self, url):
+        # The server answered 304 Not Modified: the stream is unchanged, so every
+        # stored result for it is fresh again. Throughput depends on the
+        # server's load rather than the stream and is kept as it is.
+        now = time.time()
+        kinds = [kind for kind in COLUMNS if kind not in ('liveness', 'throughput')]
+        updates = ', '.join(f'{kind}_at = CASE WHEN {kind}_at IS NULL THEN NULL ELSE ? END' for kind in kinds)
+        with self._lock:
+            self._connection.execute(
+                f'UPDATE probes SET {updates}, alive = 1, status = 200, liveness_at = ?, accessed_at = ? WHERE url = ?',
+                (*([now] * len(kinds)), now, now, normalize_url(url)),
+            )
+            self._written()
+
+    def evict(self):
+        with self._lock:
+            self._connection.execute(
+                'DELETE FROM probes WHERE url IN '
+                '(SELECT url FROM probes ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,),
+            )
+
+    def close(self):
+        self.evict()
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
@@ -0,0 +1,70 @@
+import csv
+import json
+import time
+
+# Columns of the probe report, in order
+FIELDS = ('name', 'tvg-id', 'group-title', 'url', 'latency', 'ttfb', 'resolution', 'codec', 'bitrate', 'speed_ratio',
+          'availability', 'refresh_latency', 'playability', 'checked_at')
+
+
+def _rounded(value):
+    return round(value, 3) if value is not None else None
+
+
+def report_row(entry):
+    checked_at = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(entry.checked_at)) if entry.checked_at else None
+    return {
+        'name': entry.name,
+        'tvg-id': entry.tvg_id,
+        'group-title': entry.group_title,
+        'url': entry.url,
+        'latency': _rounded(entry.latency),
+        'ttfb': _rounded(entry.ttfb),
+        'resolution': entry.resolution,
+        'codec': entry.codec,
+        'bitrate': entry.bitrate,
+        'speed_ratio': _rounded(entry.speed_ratio),
+        'availability': _rounded(entry.availability),
+        'refresh_latency': _rounded(entry.refresh_latency),
+        'playability': _rounded(entry.playability),
+        'checked_at': checked_at,
+    }
+
+
+class ReportWriter:
+    # Writes one row per entry to a .csv or .json sidecar file as entries go
+    # by, so the report never needs the whole catalog in memory
+    def __init__(self, path):
+        self.json = not path.lower().endswith('.csv')
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._rows = 0
+        if self.json:
+            self._file.write('[')
+        else:
+            self._csv = csv.DictWriter(self._file, FIELDS)
+            self._csv.writeheader()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, entry):
+        row = report_row(entry)
+        if self.json:
+            self._file.write((',\n' if self._rows else '\n') + json.dumps(row, ensure_ascii=False))
+        else:
+            self._csv.writerow(row)
+        self._rows += 1
+
+    def close(self):
+        if self.json:
+            self._file.write('\n]\n')
+        self._file.close()
+
+
+def recorded(entries, writer):
+    for entry in entries:
+        writer.write(entry)
+        yield entry
@@ -0,0 +1,231 @@
+import re
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+
+import clusters
+import group_titles
+import m3u
+import metrics
+import net
+import pipeline
+import probe
+from clusters import clean_channel_name
+from fuzzy_match import NameIndex
+
+# Configuration values
+FFPROBE_WORKERS = 100  # Parallel response time probes (manifest pre-check, then ffprobe)
+SORT_ORDER = ('group', 'tvg-id', 'resolution', 'latency', 'name')  # Sort keys in priority order, see SORT_KEYS
+RESOLUTION_TIERS = {'FHD': 0, 'HD': 1, 'SD': 2}  # Rank of each resolution label; unknown resolutions sort last
+MATCH_PROCESSES = 1  # Worker processes for EPG name matching; 1 matches in this process
+REPORTED_SIMILARITY = 0.75  # Unmatched channels closer than this to an EPG name are listed in the playlist
+THROUGHPUT_SEGMENTS = 0  # HLS segments downloaded per stream to measure playability; 0 to skip
+MIN_PLAYABILITY = None  # Entries measured below this playability (0 to 1) are dropped; None to keep all
+
+# Stage functions shared by the numbered scripts and the iptv.py pipeline
+
+
+def clean_playlist_lines(lines):
+    # Remove excessive blank lines and ensure correct format
+    blank_line = False
+    extinf_pattern = re.compile(r'#EXTINF:-1.*')
+
+    for line in lines:
+        if line.strip() == '':
+            if not blank_line:
+                yield line
+            blank_line = True
+        else:
+            if extinf_pattern.match(line):
+                line = ensure_extinf_format(line)
+            yield line
+            blank_line = False
+
+
+def ensure_extinf_format(extinf_line):
+    # Ensure the extinf line has all necessary fields with empty values if missing
+    _, attrs, _ = m3u.parse_extinf(extinf_line)
+
+    if 'tvg-logo' not in attrs:
+        extinf_line = extinf_line.replace('#EXTINF:-1', '#EXTINF:-1 tvg-logo=""')
+    if 'tvg-id' not in attrs:
+        extinf_line = extinf_line.replace('#EXTINF:-1', '#EXTINF:-1 tvg-id=""', 1)
+    if 'tvg-name' not in attrs:
+        extinf_line = extinf_line.replace('#EXTINF:-1', '#EXTINF:-1 tvg-name=""', 1)
+    if 'group-title' not in attrs:
+        extinf_line = extinf_line.replace('#EXTINF:-1', '#EXTINF:-1 group-title=""', 1)
+
+    return extinf_line
+
+
+def format_group_title(entry):
+    group_title = entry.group_title
+    if group_title:
+        entry.set('group-title', re.sub(r'\s+', ' ', group_title))
+
+
+def _tvg_id_missing(entry):
+    return not entry.tvg_id.strip()
+
+
+def _latency(entry):
+    return entry.latency if entry.latency is not None else float('inf')
+
+
+def _playability(entry):
+    return -entry.playability if entry.playability is not None else 1
+
+
+def playable(result, minimum=MIN_PLAYABILITY):
+    # Entries and probe results without a throughput measurement pass
+    return minimum is None or result.playability is None or result.playability >= minimum
+
+
+def filter_playable(entries, minimum=MIN_PLAYABILITY):
+    return (entry for entry in entries if playable(entry, minimum))
+
+
+# Sort keys by name; each maps an entry to one small comparable value
+SORT_KEYS = {
+    'group': lambda entry: entry.group_title,
+    'tvg-id': _tvg_id_missing,  # Entries with a tvg-id first
+    'resolution': lambda entry: RESOLUTION_TIERS.get(entry.resolution, len(RESOLUTION_TIERS)),
+    'latency': _latency,
+    'playability': _playability,  # Best measured playability first, unmeasured entries last
+    'name': lambda entry: entry.name.casefold(),
+}
+
+
+def sort_key(order=SORT_ORDER):
+    # The key tuple is built once per entry when the sort decorates it, so
+    # comparisons only ever look at plain strings, numbers and booleans
+    unknown = [name for name in order if name not in SORT_KEYS]
+    if unknown:
+        raise ValueError(f"Unknown sort key(s) {', '.join(unknown)}; expected {', '.join(SORT_KEYS)}")
+    keys = [SORT_KEYS[name] for name in order]
+    return lambda entry: tuple(key(entry) for key in keys)
+
+
+def sort_entries(entries, order=SORT_ORDER):
+    return pipeline.sorted_entries(entries, sort_key(order))
+
+
+def standardize_group_titles(entries, similarity_threshold=0.5):
+    # Mapping tables live in group_titles.json and are compiled once into
+    # keyword automata; results are memoized per distinct group title.
+    for entry in entries:
+        group_title = entry.group_title
+        if group_title:
+            entry.set('group-title', group_titles.standardize(group_title))
+        yield entry
+
+
+def probe_entries(entries, cache=None, workers=FFPROBE_WORKERS, healthy_mirrors=None, health=None,
+                  segments=THROUGHPUT_SEGMENTS, min_playability=MIN_PLAYABILITY):
+    # Fills the probe fields of every entry (latency, ttfb, resolution, codec,
+    # bitrate, checked_at). A manifest GET over the pooled session weeds out
+    # dead streams first; ffprobe is only started for streams that answered
+    # it. With healthy_mirrors set, each channel's mirrors are probed only
+    # until that many answer and the rest are passed through unprobed as
+    # fallbacks. `workers` only caps the threads; how many manifest requests
+    # and ffprobe processes actually run at once is tuned by the adaptive
+    # probe limits. With `health`, streams on hosts that keep failing are
+    # skipped (see host_health). With `segments`, HLS streams also get a
+    # throughput probe, and mirrors below min_playability do not count as
+    # healthy.
+    session = net.make_session(workers)
+    limits = probe.ProbeLimits()
+
+    def probe_entry(entry):
+        url, headers = entry.http_request()
+        return probe.probe_stream(session, url, headers, cache, limits, health, segments)
+
+    def is_healthy(result):
+        return result.latency is not None and playable(result, min_playability)
+
+    if healthy_mirrors:
+        yield from _record(clusters.probe_clusters(
+            entries, probe_entry, healthy_mirrors, workers, cache, is_healthy=is_healthy, desc="Probing streams"))
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = pipeline.bounded_map(executor, lambda entry: (entry, probe_entry(entry)), entries)
+        yield from _record(tqdm(results, desc="Probing streams"))
+
+
+def _record(results):
+    for entry, result in results:
+        if result is not None:
+            result.apply(entry)
+        yield entry
+
+
+_match_index = None
+
+
+def _init_match_worker(names, min_score):
+    global _match_index
+    _match_index = NameIndex(names, min_score=min_score)
+
+
+def _match_name(index, name):
+    if not name:
+        return None
+    channel_name = clean_channel_name(name)
+    return (channel_name, *index.best_match(channel_name))
+
+
+def _match_names(names):
+    # Runs in a worker process against the index its initializer built
+    return [_match_name(_match_index, name) for name in names]
+
+
+def update_tvg_ids(entries, tvg_ids, similarity_threshold=0.80, unmatched_by_entry=None, processes=MATCH_PROCESSES):
+    # unmatched_by_entry, when given, is filled with {entry: unmatched tuple}.
+    # With processes > 1 names are cleaned and matched in a process pool;
+    # every worker builds its own index from the EPG names once and gets the
+    # entry names in chunks.
+    entries = list(entries)
+    updated_entries = []
+    unmatched_entries = []
+    matched = 0
+    # Matches below both the threshold and the reported similarity are never
+    # used, so the index does not need to find them
+    min_score = min(similarity_threshold, REPORTED_SIMILARITY)
+
+    if processes > 1:
+        logging.info(f"Matching names in {processes} processes...")
+        matches = pipeline.process_map(_match_names, [entry.name for entry in entries], processes,
+                                       _init_match_worker, (list(tvg_ids), min_score))
+    else:
+        logging.info("Indexing EPG display names...")
+        index = NameIndex(tvg_ids, min_score=min_score)
+        matches = (_match_name(index, entry.name) for entry in entries)
+
+    logging.info("Updating tvg-ids...")
+    for entry, match in tqdm(zip(entries, matches), total=len(entries), desc="Processing entries"):
+        if match is not None:
+            channel_name, best_match, best_similarity = match
+
+            if best_match and best_similarity >= similarity_threshold:
+                entry.set('tvg-id', tvg_ids[best_match])
+                matched += 1
+            else:
+                unmatched_entries.append((channel_name, best_match, best_similarity))
+                if unmatched_by_entry is not None:
+                    unmatched_by_entry[entry] = unmatched_entries[-1]
+
+        updated_entries.append(entry)
+
+    metrics.count('epg_matches', matched, outcome='matched')
+    metrics.count('epg_matches', len(unmatched_entries), outcome='unmatched')
+    return updated_entries, unmatched_entries
+
+
+def write_unmatched(file, unmatched_entries):
+    if unmatched_entries:
+        file.write("\n# Unmatched Channels:\n")
+        unmatched_entries.sort(key=lambda x: -x[2])  # Sort by similarity in descending order
+        for channel_name, best_match, similarity in unmatched_entries:
+            if similarity > REPORTED_SIMILARITY:
+                file.write(f"# Channel: {channel_name}, Best Match: {best_match}, Similarity: {similarity:.2f}\n")
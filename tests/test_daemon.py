@@ -0,0 +1,21 @@
+import pytest
+
+from daemon import accepts_gzip
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip', True),
+    ('gzip, deflate, br', True),
+    ('br;q=1.0, GZIP;q=0.5', True),
+    ('x-gzip', True),
+    ('*', True),
+    ('gzip;q=0', False),
+    ('gzip; q=0.000', False),
+    ('*;q=0', False),
+    ('gzip;q=0, *', False),
+    ('deflate, *;q=0.1', True),
+    ('identity', False),
+    ('', False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(header) is expected
@@ -0,0 +1,92 @@
+import pytest
+
+import dedupe
+import m3u
+from url_utils import normalize_url, url_hash
+
+
+def entry(name, url, tvg_id='', latency=None, options=None):
+    item = m3u.Entry(attrs={'tvg-id': tvg_id}, name=name, options=options, url=url)
+    item.latency = latency
+    return item
+
+
+@pytest.mark.parametrize('url', [
+    'HTTP://Example.COM:80/live/one.m3u8?a=1&b=2',
+    'http://example.com/live/one.m3u8/?a=1&b=2',
+    'http://example.com/live/one.m3u8?a=1&b=2#start',
+    'http://example.com/live/one.m3u8?b=2&a=1',
+    'http://example.com/live/one.m3u8?a=1&utm_source=feed&b=2&fbclid=x',
+    ' http://example.com/live/one.m3u8?a=1&b=2 ',
+])
+def test_equivalent_urls_share_a_key(url):
+    assert normalize_url(url) == 'http://example.com/live/one.m3u8?a=1&b=2'
+    assert url_hash(url) == url_hash('http://example.com/live/one.m3u8?a=1&b=2')
+
+
+@pytest.mark.parametrize('url', [
+    'https://example.com/live/one.m3u8',
+    'http://example.com:8080/live/one.m3u8',
+    'http://example.com/live/One.m3u8',
+    'http://example.com/live/one.m3u8?a=2',
+    'http://user@example.com/live/one.m3u8',
+])
+def test_different_streams_keep_their_own_key(url):
+    assert url_hash(url) != url_hash('http://example.com/live/one.m3u8')
+
+
+def test_kodi_headers_are_part_of_the_key():
+    plain = entry('A', 'http://example.com/a.m3u8')
+    with_agent = entry('A', 'http://example.com/a.m3u8|User-Agent=Player&Referer=http://x/')
+    reordered = entry('A', 'http://EXAMPLE.com/a.m3u8|Referer=http://x/&User-Agent=Player')
+    assert dedupe.entry_key(plain) != dedupe.entry_key(with_agent)
+    assert dedupe.entry_key(with_agent) == dedupe.entry_key(reordered)
+
+
+def duplicates():
+    return [
+        entry('One', 'http://example.com/one.m3u8', latency=2.0),
+        entry('Two', 'http://example.com/two.m3u8'),
+        entry('One HD', 'http://EXAMPLE.com/one.m3u8?utm_source=x', tvg_id='One.id', latency=3.0),
+        entry('One Fast', 'http://example.com:80/one.m3u8/', latency=1.0),
+    ]
+
+
+@pytest.mark.parametrize('policy, expected', [
+    ('first', ['One', 'Two']),
+    ('last', ['One Fast', 'Two']),
+    ('best', ['One HD', 'Two']),
+])
+def test_policies_keep_one_entry_at_the_first_position(policy, expected):
+    assert [item.name for item in dedupe.deduplicate(duplicates(), policy)] == expected
+
+
+def test_best_prefers_the_faster_stream_when_tvg_ids_tie():
+    entries = [entry('Slow', 'http://example.com/a', latency=2.0), entry('Unprobed', 'http://example.com/a'),
+               entry('Fast', 'http://example.com/a', latency=0.5)]
+    assert [item.name for item in dedupe.deduplicate(entries, 'best')] == ['Fast']
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        list(dedupe.deduplicate(duplicates(), 'random'))
+
+
+def test_merge_options_adds_missing_kodiprops_only():
+    kept = entry('Kept', 'http://example.com/a', options=['#KODIPROP:inputstream.adaptive.license_type=clearkey'])
+    dropped = entry('Dropped', 'http://example.com/a', options=[
+        '#KODIPROP:inputstream.adaptive.license_type=widevine',
+        '#KODIPROP:inputstream.adaptive.license_key=0123:4567',
+        '#EXTVLCOPT:http-user-agent=Player/1.0',
+    ])
+    dedupe.merge_options(kept, dropped)
+    assert kept.options == ['#KODIPROP:inputstream.adaptive.license_type=clearkey',
+                            '#KODIPROP:inputstream.adaptive.license_key=0123:4567']
+
+
+def test_last_merges_kodiprops_of_dropped_duplicates():
+    entries = [entry('First', 'http://example.com/a', options=['#KODIPROP:inputstream.adaptive.license_key=0123:4567']),
+               entry('Last', 'http://example.com/a')]
+    (kept,) = dedupe.deduplicate(entries, 'last')
+    assert kept.name == 'Last'
+    assert kept.options == ['#KODIPROP:inputstream.adaptive.license_key=0123:4567']
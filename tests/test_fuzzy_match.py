@@ -0,0 +1,62 @@
+import glob
+import os
+import random
+from difflib import SequenceMatcher
+
+import m3u
+from clusters import clean_channel_name
+from fuzzy_match import NameIndex
+
+PLAYLISTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Playlist')
+MIN_SCORE = 0.75
+
+
+def brute_force(query, names):
+    # The linear scan NameIndex replaces; names that cannot score higher than
+    # the best so far are skipped, which does not change the result
+    best_match, best_similarity = None, 0
+    for name in names:
+        matcher = SequenceMatcher(None, query, name)
+        if matcher.real_quick_ratio() <= best_similarity or matcher.quick_ratio() <= best_similarity:
+            continue
+        similarity = matcher.ratio()
+        if similarity > best_similarity:
+            best_match, best_similarity = name, similarity
+    return best_match, best_similarity
+
+
+def channel_names():
+    names = []
+    for path in sorted(glob.glob(os.path.join(PLAYLISTS, '*'))):
+        with open(path, 'r', encoding='utf-8', errors='replace') as file:
+            names.extend(clean_channel_name(entry.name) for entry in m3u.iter_entries(file))
+    names = [name for name in dict.fromkeys(names) if name]
+    random.Random(1).shuffle(names)
+    return names
+
+
+def test_same_matches_as_brute_force():
+    names = channel_names()
+    guide, others = names[:len(names) // 2], names[len(names) // 2:]
+    # Near misses, some of which a shortlist of the names sharing the most
+    # n-grams got wrong
+    queries = ['oviedo tv [not 24/7]', 'tvnova tv', 'saktitv tv', 'jonack tv [not 24/7]', 'tiver tv', 'zaz tv']
+    queries += others[:100] + [name.replace(' ', '', 1) + ' tv' for name in others[100:200]]
+    index = NameIndex(guide, min_score=MIN_SCORE)
+    for query in queries:
+        expected = brute_force(query, guide)
+        if expected[1] >= MIN_SCORE:
+            assert index.best_match(query) == expected, query
+        else:
+            assert index.best_match(query)[1] < MIN_SCORE, query
+
+
+def test_first_name_wins_ties():
+    index = NameIndex(['abcx', 'abcy'], min_score=0.5)
+    assert index.best_match('abcz') == ('abcx', 0.75)
+    assert index.best_match('abcx') == ('abcx', 1.0)
+
+
+def test_nothing_below_min_score():
+    index = NameIndex(['abcx', 'abcy'], min_score=0.5)
+    assert index.best_match('nothing alike') == (None, 0)
@@ -0,0 +1,80 @@
+import json
+import time
+
+import iptv
+import probe
+
+CHANNELS = 10
+MIRRORS = 6
+HEALTHY_MIRRORS = 3
+
+
+def write_playlist(path):
+    lines = ['#EXTM3U']
+    for channel in range(CHANNELS):
+        for mirror in range(MIRRORS):
+            lines.append(f'#EXTINF:-1 tvg-id="Channel{channel}.id" group-title="News",Channel {channel}')
+            lines.append(f'http://mirror{mirror}.example/{channel}.m3u8')
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+
+def test_unchanged_rerun_probes_nothing(tmp_path, monkeypatch):
+    probed = []
+
+    def probe_stream(session, url, headers=None, cache=None, limits=None, health=None, segments=0):
+        # The first mirror of every channel is dead, so each channel probes
+        # four mirrors and keeps two as unprobed fallbacks
+        probed.append(url)
+        alive = not url.startswith('http://mirror0.')
+        return probe.StreamProbe(alive, latency=0.5 if alive else None, checked_at=time.time())
+
+    monkeypatch.setattr(probe, 'probe_stream', probe_stream)
+    source = tmp_path / 'source.m3u'
+    write_playlist(source)
+    config = tmp_path / 'config.json'
+    config.write_text(json.dumps({'healthy_mirrors': HEALTHY_MIRRORS}), encoding='utf-8')
+    output = tmp_path / 'playlist.m3u'
+    argv = ['--config', str(config), '--input', str(source), '--output', str(output),
+            '--stages', 'fetch,restore,probe,sort,write', '--incremental', str(tmp_path / 'build_manifest.sqlite3'),
+            '--no-probe-cache', '--no-host-health']
+
+    iptv.main(argv)
+    assert len(probed) == CHANNELS * (HEALTHY_MIRRORS + 1)
+    first = output.read_text(encoding='utf-8')
+
+    probed.clear()
+    iptv.main(argv)
+    assert probed == []
+    assert output.read_text(encoding='utf-8') == first
+
+
+def test_changed_epg_resets_restored_tvg_ids(tmp_path, monkeypatch):
+    guides = [{'news one': 'NewsOne.epg', 'sport two': 'SportTwo.epg'}, {'sport two': 'SportTwoNew.epg'}]
+    monkeypatch.setattr(iptv.epg_fetch, 'fetch_all', lambda urls: guides[0])
+    source = tmp_path / 'source.m3u'
+    source.write_text('#EXTM3U\n'
+                      '#EXTINF:-1 group-title="News",News One\nhttp://example.com/news.m3u8\n'
+                      '#EXTINF:-1 tvg-id="Sport.source" group-title="Sport",Sport Two\nhttp://example.com/sport.m3u8\n',
+                      encoding='utf-8')
+    output = tmp_path / 'playlist.m3u'
+    argv = ['--input', str(source), '--output', str(output), '--epg-url', 'http://example.com/guide.xml',
+            '--stages', 'fetch,restore,epg-fetch,epg-match,sort,write',
+            '--incremental', str(tmp_path / 'build_manifest.sqlite3'), '--no-probe-cache', '--no-host-health']
+
+    iptv.main(argv)
+    text = output.read_text(encoding='utf-8')
+    assert 'tvg-id="NewsOne.epg"' in text and 'tvg-id="SportTwo.epg"' in text
+
+    # News One no longer matches: it goes back to having no tvg-id, as read
+    guides.pop(0)
+    iptv.main(argv)
+    text = output.read_text(encoding='utf-8')
+    assert 'NewsOne.epg' not in text
+    assert '#EXTINF:-1 group-title="News",News One' in text
+    assert 'tvg-id="SportTwoNew.epg"' in text
+
+    # And back to its source tvg-id when nothing matches any more
+    guides[0] = {}
+    iptv.main(argv)
+    text = output.read_text(encoding='utf-8')
+    assert 'tvg-id="Sport.source"' in text and 'SportTwoNew.epg' not in text
@@ -0,0 +1,54 @@
+import m3u
+
+PLAYLIST = '''#EXTM3U
+#KODIPROP:inputstream.adaptive.license_type=clearkey
+#KODIPROP:inputstream.adaptive.license_key=0123:4567
+#EXTINF:-1 tvg-id="One.id" group-title="News",One
+#EXTVLCOPT:http-user-agent=Player/1.0
+http://example.com/one.mpd
+#EXTINF:-1 tvg-id="Two.id" group-title="News",Two
+#EXTHTTP:{"Referer": "http://example.com/"}
+http://example.com/two.m3u8
+#EXTVLCOPT:http-origin=http://example.com
+'''
+
+
+def parse(text):
+    return list(m3u.iter_entries(text.splitlines()))
+
+
+def test_option_lines_keep_their_position():
+    one, two = parse(PLAYLIST)
+    assert one.leading == ['#KODIPROP:inputstream.adaptive.license_type=clearkey',
+                           '#KODIPROP:inputstream.adaptive.license_key=0123:4567']
+    assert one.options == ['#EXTVLCOPT:http-user-agent=Player/1.0']
+    assert two.leading == ()
+    assert two.options == ['#EXTHTTP:{"Referer": "http://example.com/"}']
+    assert two.trailing == ['#EXTVLCOPT:http-origin=http://example.com']
+
+
+def test_round_trip():
+    entries = parse(PLAYLIST)
+    written = '\n'.join(['#EXTM3U'] + [line for entry in entries for line in entry.lines()]) + '\n'
+    assert written == PLAYLIST
+    assert [entry.lines() for entry in parse(written)] == [entry.lines() for entry in entries]
+
+
+def test_option_lines_before_extinf_set_headers():
+    one, two = parse(PLAYLIST)
+    assert one.http_headers() == {'User-Agent': 'Player/1.0'}
+    assert two.http_headers() == {'Referer': 'http://example.com/', 'Origin': 'http://example.com'}
+
+
+def test_entries_without_url_are_dropped_with_their_options():
+    entries = parse('#EXTINF:-1,Disabled\n#KODIPROP:inputstream.adaptive.license_key=dead\n'
+                    '#EXTINF:-1,Live\nhttp://example.com/live.m3u8\n')
+    assert [entry.name for entry in entries] == ['Live']
+    assert entries[0].lines() == ['#EXTINF:-1,Live', 'http://example.com/live.m3u8']
+
+
+def test_parse_extinf_attributes():
+    duration, attrs, name = m3u.parse_extinf('#EXTINF:-1 tvg-id="A.id" group-title="News, Sport", group-logo="x",A, B')
+    assert duration == '-1'
+    assert attrs == {'tvg-id': 'A.id', 'group-title': 'News, Sport', 'group-logo': 'x'}
+    assert name == 'A, B'
@@ -0,0 +1,43 @@
+import random
+
+import pytest
+
+import m3u
+import pipeline
+
+
+def names(entries):
+    # Spilled entries come back from disk as copies
+    return [entry.name for entry in entries]
+
+
+def entries(count):
+    rng = random.Random(count)
+    return [m3u.Entry(attrs={'group-title': rng.choice('ABCD')}, name=f'Channel {i}', url=f'http://example.com/{i}')
+            for i in range(count)]
+
+
+@pytest.mark.parametrize('count, buffer_size', [(0, 4), (3, 4), (4, 4), (50, 4), (50, 7), (50, 1000)])
+def test_external_sort_matches_sorted(count, buffer_size):
+    items = entries(count)
+    key = lambda entry: entry.group_title
+    result = pipeline.sorted_entries(iter(items), key, buffer_size=buffer_size)
+    # sorted() is stable, so equal groups keep their input order
+    assert names(result) == names(sorted(items, key=key))
+
+
+def test_external_sort_spills_runs_to_disk(monkeypatch):
+    written = []
+    write_run = pipeline._write_run
+    monkeypatch.setattr(pipeline, '_write_run', lambda buffer: written.append(len(buffer)) or write_run(buffer))
+    items = entries(10)
+    result = list(pipeline.sorted_entries(items, lambda entry: entry.group_title, buffer_size=4))
+    assert written == [4, 4, 2]
+    assert names(result) == names(sorted(items, key=lambda entry: entry.group_title))
+    assert result[0].url.startswith('http://example.com/')
+
+
+def test_entries_are_never_compared():
+    # Entry has no ordering, so ties must be broken by input position
+    items = [m3u.Entry(name=str(i)) for i in range(9)]
+    assert names(pipeline.sorted_entries(items, lambda entry: 0, buffer_size=2)) == names(items)
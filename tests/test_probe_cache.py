@@ -0,0 +1,66 @@
+import pytest
+
+import probe_cache
+
+URL = 'http://example.com/live/one.m3u8'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(probe_cache.time, 'time', clock)
+    return clock
+
+
+def test_results_expire_after_their_ttl(tmp_path, clock):
+    with probe_cache.ProbeCache(tmp_path / 'cache.sqlite3', ttl={'response_time': 60}) as cache:
+        cache.put(URL, 'response_time', 0.8)
+        clock.now += 60
+        assert cache.get(URL, 'response_time') == (True, 0.8)
+        clock.now += 1
+        assert cache.get(URL, 'response_time') == (False, None)
+
+
+def test_failures_expire_after_the_failure_ttl(tmp_path, clock):
+    with probe_cache.ProbeCache(tmp_path / 'cache.sqlite3', failure_ttl=10) as cache:
+        cache.put(URL, 'liveness', (False, 404))
+        cache.put('http://example.com/live/two.m3u8', 'liveness', (True, 200))
+        clock.now += 11
+        assert cache.get(URL, 'liveness') == (False, None)
+        assert cache.get('http://example.com/live/two.m3u8', 'liveness') == (True, (True, 200))
+
+
+def test_lookups_use_the_normalized_url(tmp_path, clock):
+    with probe_cache.ProbeCache(tmp_path / 'cache.sqlite3') as cache:
+        cache.put(URL, 'resolution', '1080p')
+        assert cache.get('HTTP://EXAMPLE.com:80/live/one.m3u8?utm_source=x', 'resolution') == (True, '1080p')
+        assert cache.get(URL, 'codec') == (False, None)
+
+
+def test_least_recently_used_urls_are_evicted_on_close(tmp_path, clock):
+    path = tmp_path / 'cache.sqlite3'
+    urls = [f'http://example.com/{i}.m3u8' for i in range(4)]
+    with probe_cache.ProbeCache(path, max_entries=2) as cache:
+        for url in urls:
+            clock.now += 1
+            cache.put(url, 'response_time', 1.0)
+        clock.now += 1
+        assert cache.get(urls[0], 'response_time') == (True, 1.0)
+    with probe_cache.ProbeCache(path, max_entries=2) as cache:
+        assert [cache.get(url, 'response_time')[0] for url in urls] == [True, False, False, True]
+
+
+def test_results_survive_reopening(tmp_path, clock):
+    path = tmp_path / 'cache.sqlite3'
+    with probe_cache.ProbeCache(path) as cache:
+        cache.put(URL, 'throughput', (1.5, 1.0, 0.2, 0.9))
+    with probe_cache.ProbeCache(path) as cache:
+        assert cache.get(URL, 'throughput') == (True, (1.5, 1.0, 0.2, 0.9))
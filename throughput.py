@@ -0,0 +1,142 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+
+import manifest
+import metrics
+from url_utils import url_host
+
+# Configuration values
+SEGMENTS = 3  # Segments downloaded at the same time per stream
+PLAYLIST_TIMEOUT = (5, 15)  # Connect and read timeout for the master and media playlists
+SEGMENT_TIMEOUT = (5, 20)  # Connect and read timeout for one segment
+MAX_PLAYLIST_BYTES = 2 * 1024 * 1024  # Playlists larger than this are not read further
+MAX_SEGMENT_BYTES = 32 * 1024 * 1024  # Segments larger than this are not read further
+CHUNK_SIZE = 64 * 1024
+PLAYABLE_RATIO = 1.5  # Headroom over real time at which a stream counts as fully playable
+
+
+class ThroughputResult:
+    # speed_ratio: seconds of media downloaded per second of wall time;
+    # availability: share of segment and playlist requests that succeeded;
+    # refresh_latency: seconds to reload the media playlist (live streams only);
+    # bitrate: bits/s of the downloaded segments; playability: 0 to 1, see
+    # playability()
+    __slots__ = ('speed_ratio', 'availability', 'refresh_latency', 'bitrate', 'playability')
+
+    def __init__(self, speed_ratio=None, availability=0.0, refresh_latency=None, bitrate=None, playability=0.0):
+        self.speed_ratio = speed_ratio
+        self.availability = availability
+        self.refresh_latency = refresh_latency
+        self.bitrate = bitrate
+        self.playability = playability
+
+    def __repr__(self):
+        return (f'ThroughputResult(speed_ratio={self.speed_ratio}, availability={self.availability}, '
+                f'refresh_latency={self.refresh_latency}, playability={self.playability})')
+
+
+def playability(speed_ratio, availability, refresh_latency=None, target_duration=0.0):
+    # A live player has to reload the playlist and download one segment every
+    # target duration; the headroom is how many times over it manages both.
+    # Streams with PLAYABLE_RATIO headroom and every request answered score 1.
+    if not speed_ratio:
+        return 0.0
+    headroom = speed_ratio
+    if refresh_latency is not None and target_duration:
+        headroom = target_duration / (target_duration / speed_ratio + refresh_latency)
+    return availability * min(1.0, headroom / PLAYABLE_RATIO)
+
+
+def _download(session, url, headers, timeout, limit, body=None):
+    # Returns (size, seconds, final_url); size is None when the request failed.
+    # The body is only kept when a bytearray is passed in.
+    start_time = time.monotonic()
+    size = 0
+    try:
+        with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code >= 400:
+                return None, time.monotonic() - start_time, url
+            for chunk in response.iter_content(CHUNK_SIZE):
+                size += len(chunk)
+                if body is not None:
+                    body += chunk
+                if size >= limit:
+                    break
+            url = response.url or url
+    except requests.RequestException:
+        return None, time.monotonic() - start_time, url
+    return size, time.monotonic() - start_time, url
+
+
+def _media_playlist(session, url, headers):
+    # Returns (media_playlist_url, MediaPlaylist, declared_bandwidth), or None
+    # when the URL is not an HLS stream; the playlist is None when it failed
+    body = bytearray()
+    size, _, url = _download(session, url, headers, PLAYLIST_TIMEOUT, MAX_PLAYLIST_BYTES, body)
+    if size is None:
+        return url, None, None
+    if manifest.sniff(bytes(body[:1024])) != manifest.HLS:
+        return None
+    text = body.decode('utf-8', 'replace')
+    kind, variants = manifest.parse_hls(text)
+    bandwidth = None
+    if kind == manifest.HLS_MASTER:
+        # The variant the probe reports: highest resolution, then bandwidth
+        variant = manifest.best_variant(variants) or max(variants, key=lambda variant: variant.bandwidth, default=None)
+        if variant is None:
+            return url, None, None
+        bandwidth = variant.bandwidth or None
+        body = bytearray()
+        size, _, url = _download(session, urljoin(url, variant.uri), headers, PLAYLIST_TIMEOUT,
+                                 MAX_PLAYLIST_BYTES, body)
+        if size is None:
+            return url, None, bandwidth
+        text = body.decode('utf-8', 'replace')
+    return url, manifest.parse_media_playlist(text), bandwidth
+
+
+def measure(session, url, headers=None, segments=SEGMENTS):
+    # Starts an HLS stream the way a player does: master playlist, best
+    # variant, media playlist, then `segments` segments downloaded at the same
+    # time over the pooled session (the live edge of a live playlist, the
+    # start of a VOD one) while the media playlist is reloaded once. Returns
+    # None for streams that are not HLS.
+    found = _media_playlist(session, url, headers)
+    if found is None:
+        return None
+    playlist_url, playlist, bandwidth = found
+    if playlist is None or not playlist.segments:
+        return ThroughputResult(bitrate=bandwidth)
+
+    chosen = playlist.segments[:segments] if playlist.ended else playlist.segments[-segments:]
+    reload = not playlist.ended
+    with ThreadPoolExecutor(max_workers=len(chosen) + reload) as executor:
+        start_time = time.monotonic()
+        downloads = [executor.submit(_download, session, urljoin(playlist_url, uri), headers, SEGMENT_TIMEOUT,
+                                     MAX_SEGMENT_BYTES)
+                     for _, uri in chosen]
+        refresh = (executor.submit(_download, session, playlist_url, headers, PLAYLIST_TIMEOUT, MAX_PLAYLIST_BYTES)
+                   if reload else None)
+        sizes = [future.result()[0] for future in downloads]
+        elapsed = time.monotonic() - start_time
+        refresh_size, refresh_latency, _ = refresh.result() if reload else (None, None, None)
+
+    loaded = [(duration, size) for (duration, _), size in zip(chosen, sizes) if size is not None]
+    media_seconds = sum(duration for duration, _ in loaded)
+    answered = len(loaded) + (reload and refresh_size is not None)
+    if metrics.ENABLED:
+        metrics.count('segments', len(loaded), host=url_host(url), outcome='loaded')
+        metrics.count('segments', len(chosen) - len(loaded), host=url_host(url), outcome='failed')
+
+    result = ThroughputResult(
+        speed_ratio=media_seconds / elapsed if loaded and elapsed > 0 else 0.0,
+        availability=answered / (len(chosen) + reload),
+        refresh_latency=refresh_latency if refresh_size is not None else None,
+        bitrate=int(sum(size for _, size in loaded) * 8 / media_seconds) if media_seconds else bandwidth,
+    )
+    result.playability = playability(result.speed_ratio, result.availability, result.refresh_latency,
+                                     playlist.target_duration)
+    return result
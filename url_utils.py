@@ -0,0 +1,67 @@
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid', '_ga', 'ref', 'ref_src'}
+TRACKING_PREFIXES = ('utm_',)
+
+
+def is_tracking_param(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def url_host(url):
+    try:
+        return (urlsplit(url).hostname or '').lower()
+    except ValueError:
+        return ''
+
+
+def url_authority(url):
+    # Host with its explicit port, e.g. example.com:8080; servers on different
+    # ports of one host are often different services
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower()
+        return f'{host}:{parts.port}' if parts.port else host
+    except ValueError:
+        return ''
+
+
+def normalize_url(url):
+    # Canonical form used as a cache/dedupe key: lowercase scheme and host,
+    # no default port, no trailing slash, no fragment, sorted query
+    # parameters without analytics tracking tokens.
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if not scheme or not host:
+        return url
+    netloc = f'[{host}]' if ':' in host else host
+    if parts.password is not None:
+        netloc = f'{parts.username or ""}:{parts.password}@{netloc}'
+    elif parts.username:
+        netloc = f'{parts.username}@{netloc}'
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc = f'{netloc}:{port}'
+    path = parts.path.rstrip('/') or '/'
+    params = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True) if not is_tracking_param(name)]
+    query = urlencode(sorted(params), safe='/:@')
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+def url_hash(url, headers=None):
+    # 64-bit key of the normalized URL (and request headers, if any). A set of
+    # these ints takes a fraction of the memory of the URL strings; a
+    # collision is unlikely (~1e-8 at a million streams).
+    key = normalize_url(url)
+    if headers:
+        key = f'{key}|{urlencode(sorted(headers.items()))}'
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
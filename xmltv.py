@@ -0,0 +1,75 @@
+import xml.etree.ElementTree as ET
+import zlib
+from itertools import chain
+
+# Configuration values
+CHUNK_SIZE = 64 * 1024  # Bytes read from the source per step
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def read_chunks(file, chunk_size=CHUNK_SIZE):
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def decompressed(chunks):
+    # Transparently gunzip the stream when it starts with the gzip magic bytes.
+    # Concatenated gzip members are handled one after another.
+    chunks = iter(chunks)
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= len(GZIP_MAGIC):
+            break
+    if not head.startswith(GZIP_MAGIC):
+        if head:
+            yield head
+        yield from chunks
+        return
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chain((head,), chunks):
+        while chunk:
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+            if not decompressor.eof:
+                break
+            chunk = decompressor.unused_data
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = decompressor.flush()
+    if data:
+        yield data
+
+
+def iter_channels(chunks):
+    # Yield (channel id, [display names]) for every <channel> in an XMLTV
+    # document fed as byte chunks. Elements are dropped from the tree as soon
+    # as they are handled, so <programme> nodes never accumulate in memory.
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    root = None
+    for chunk in decompressed(chunks):
+        parser.feed(chunk)
+        for event, element in parser.read_events():
+            if event == 'start':
+                if root is None:
+                    root = element
+                continue
+            if element.tag == 'channel':
+                channel_id = (element.get('id') or '').strip()
+                display_names = [
+                    name.text.strip() for name in element.iter('display-name') if name.text and name.text.strip()
+                ]
+                if channel_id:
+                    yield channel_id, display_names
+            if element.tag in ('channel', 'programme') and root is not None:
+                root.clear()
+    parser.close()
+
+
+def parse_file(file_path):
+    with open(file_path, 'rb') as file:
+        yield from iter_channels(read_chunks(file))